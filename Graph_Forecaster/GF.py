@@ -4,15 +4,25 @@
 # pip install biopython crossrefapi scholarly requests sentence-transformers duckduckgo_search plotly
 
 import os
+import sys
 import json
 import uuid
 import time
 import hashlib
+import random
 import pickle
+import sqlite3
+import threading
+import functools
+import atexit
+from contextlib import contextmanager
 from datetime import datetime, timedelta
+from email.utils import parsedate_to_datetime
 from dataclasses import dataclass, field, asdict
-from typing import List, Dict, Tuple, Optional, Set
+from typing import Any, Callable, List, Dict, Tuple, Optional, Set
 from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor, Future
+from urllib.parse import urlparse
 import re
 import logging
 
@@ -26,7 +36,7 @@ from sklearn.decomposition import PCA
 import networkx as nx
 
 # LLM
-from openai import OpenAI
+from openai import OpenAI, APIConnectionError
 
 # Data sources (core)
 from duckduckgo_search import DDGS
@@ -76,6 +86,19 @@ except ImportError as e:
 # ----------------------------------------------------------------
 # ОПЦИОНАЛЬНЫЕ БИБЛИОТЕКИ — функции-заглушки активируются при отсутствии
 # ----------------------------------------------------------------
+try:
+    import fcntl                           # межпроцессные блокировки кэша (POSIX)
+    FCNTL_AVAILABLE = True
+except ImportError:
+    FCNTL_AVAILABLE = False
+    _pre_logger.warning("fcntl недоступен — кэш защищён от гонок только внутри одного процесса")
+
+try:
+    import httpx                           # асинхронный вариант HttpClient (HttpClient.async_client)
+    HTTPX_AVAILABLE = True
+except ImportError:
+    HTTPX_AVAILABLE = False
+
 try:
     import transformers                    # для sentiment-моделей
     TRANSFORMERS_AVAILABLE = True
@@ -103,6 +126,7 @@ class Config:
     
     # Models
     EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+    EMBEDDING_BATCH_SIZE = 64
     LLM_MODEL = "gpt-4o-mini"
 
     # Sentiment models (опциональные, загружаются лениво)
@@ -122,24 +146,145 @@ class Config:
     MAX_GITHUB_PER_QUERY         = 10
     MAX_RESEARCHGATE_PER_QUERY   = 10   # ResearchGate (web scraping)
     MAX_FORUM_PER_QUERY          = 20   # форумы (Reddit, HN, StackExchange)
+    MAX_REDDIT_API_PER_QUERY     = 25   # Reddit API; больше 100 — постранично по курсору after
     MAX_INVESTMENT_PER_QUERY     = 10   # финансовые базы (заглушки)
     
     # Discovery parameters
     MAX_RECURSIVE_DEPTH   = 5
     MAX_NODES_PER_LEVEL   = 50
     CROSS_DOMAIN_BATCH_SIZE = 20
+    # Сколько запросов расширения генерируется впрок, пока расширяется текущий узел;
+    # остальные слоты LLMExecutor остаются извлечению
+    EXPANSION_QUERY_PREFETCH = 2
+    
+    # Пакетное LLM-извлечение узлов (_extract_nodes_data): несколько документов
+    # в одном запросе, общая инструкция/схема передаётся один раз.
+    # max_chars ограничивает суммарный текст документов в запросе,
+    # max_tokens_per_doc — бюджет ответа на один документ.
+    NODE_EXTRACTION_BATCH = {
+        'enabled': True,
+        'max_docs': 8,
+        'max_chars': 24000,
+        'max_tokens_per_doc': 700,
+    }
+    
+    # Ленивое LLM-обогащение узлов: при создании — только эмбеддинг и метаданные.
+    # Извлечение сразу — для узлов с косинусной близостью к цели >= min_similarity,
+    # остальные обогащаются при выборе для расширения или при первом чтении поля
+    # вроде node.limitations. Построение графа и прогноз их не обогащают.
+    LAZY_ENRICHMENT = {
+        'enabled': True,
+        'min_similarity': 0.30,
+    }
     
     # Similarity thresholds
     MIN_SEMANTIC_SIMILARITY = 0.15
     MIN_EDGE_CONFIDENCE     = 0.10
+    EDGE_TILE_SIZE          = 2048   # блок матрицы сходства: пик памяти ~ EDGE_TILE_SIZE² × 4 байт
+    
+    # Приближённый поиск соседей (IVFIndex) вместо точного all-pairs.
+    # Включается автоматически от min_nodes узлов; nlist None = ~sqrt(n).
+    # Recall vs скорость: python GF.py bench-ann
+    ANN_INDEX = {
+        'enabled':     True,
+        'min_nodes':   20_000,
+        'nlist':       None,
+        'nprobe':      8,
+        'kmeans_iter': 10,
+    }
     
     # Rate limiting
     REQUESTS_PER_MINUTE     = 60
-    DELAY_BETWEEN_REQUESTS  = 1.0
+    
+    # Независимые token bucket'ы (запросов в минуту). Ключ — имя источника
+    # (см. _search_sources), HTTP-хост или "llm:<model>" (fallback на 'llm').
+    # "llm_tokens:<model>" — бюджет токенов в минуту (промпт + max_tokens).
+    # 429 / Retry-After временно останавливают и замедляют только свой bucket.
+    RATE_LIMITS = {
+        'default':                  REQUESTS_PER_MINUTE,
+        'llm':                      500,
+        'llm_tokens':               200_000,
+        'arxiv':                    20,     # arXiv просит не чаще 1 запроса в 3 с
+        'pubmed':                   180,    # NCBI: 3 запроса/с без API-ключа
+        'crossref':                 300,
+        'google_scholar':           10,
+        'api.semanticscholar.org':  60,
+        'oauth.reddit.com':         60,
+        'duckduckgo':               60,     # общий для всех DDG-источников (WebSearchClient)
+    }
+    RATE_LIMIT_RETRIES = {'http': 3, 'llm': 4}   # повторов после 429
+    
+    # Параллельные LLM-запросы (LLMExecutor): не больше max_in_flight
+    # одновременно; таймауты, обрывы и 5xx повторяются с jittered backoff
+    # (число повторов — RATE_LIMIT_RETRIES['llm']).
+    LLM_EXECUTOR = {
+        'max_in_flight': 8,
+        'backoff_s':     1.0,
+        'max_backoff_s': 30.0,
+    }
+    
+    # Общий HTTP-клиент (HttpClient): пул keep-alive соединений на хост
+    HTTP_SETTINGS = {
+        'connect_timeout': 5.0,
+        'read_timeout':    20.0,
+        'pool_maxsize':    16,      # соединений на хост (>= SOURCE_WORKERS)
+        'user_agent':      "GraphForecasterV6/1.0",
+    }
+    
+    # Поиск DuckDuckGo (WebSearchClient): число долгоживущих сессий и
+    # объединение site:-фильтров форумов в один OR-запрос вместо параллельных
+    WEB_SEARCH = {
+        'sessions':             4,
+        'combine_site_queries': False,
+    }
+    
+    # Параллельный опрос источников в _execute_multi_source_queries.
+    # SOURCE_CONCURRENCY — сколько одновременных вызовов разрешено каждому источнику.
+    CONCURRENT_SOURCES = True
+    SOURCE_WORKERS     = 8
+    SOURCE_CONCURRENCY = {
+        'default':        2,
+        'google_scholar': 1,   # scholarly легко ловит капчу
+        'researchgate':   1,
+        'model_memory':   2,
+    }
+    # Здоровье источников (SourceHealth): после failure_threshold ошибок подряд
+    # источник пропускается cooldown_s, затем одна пробная попытка.
+    # batch_budget_s — бюджет времени на один вызов _execute_multi_source_queries
+    # (None = без ограничения): быстрые по p95 источники запускаются первыми,
+    # не успевшие стартовать до дедлайна пропускаются.
+    SOURCE_HEALTH = {
+        'failure_threshold': 3,
+        'cooldown_s':        120.0,
+        'batch_budget_s':    None,
+        'slow_p95_s':        10.0,    # источники медленнее (p95) запускаются в конце пачки
+    }
+    # Сколько ждать медленные итераторы источников (сек), см. _take_with_timeout
+    SOURCE_TIMEOUTS = {
+        'google_scholar': 30.0,
+    }
     
     # Cache
     CACHE_DIR    = "./cache"
     ENABLE_CACHE = True
+    EMBEDDING_CACHE_DTYPE = "float32"   # "float16" — вдвое меньше на диске ценой точности
+
+    # Бюджеты кэша по namespace (None = без ограничения), вытеснение по LRU.
+    # Сжать кэш на диске: python GF.py compact-cache
+    CACHE_BUDGETS = {
+        'embeddings':     {'max_entries': None,    'max_bytes': 2 * 1024**3,   'ttl_days': None},
+        'llm_responses':  {'max_entries': 500_000, 'max_bytes': 1 * 1024**3,   'ttl_days': 180},
+        'search_results': {'max_entries': 200_000, 'max_bytes': 512 * 1024**2, 'ttl_days': 7},
+        'url_checks':     {'max_entries': 500_000, 'max_bytes': 128 * 1024**2, 'ttl_days': 30},
+    }
+    
+    # Проверка ссылок (UrlVerifier): живые URL помним дольше, чем мёртвые
+    URL_VERIFY = {
+        'timeout':       5.0,
+        'max_workers':   16,
+        'ttl_ok_days':   30,
+        'ttl_fail_days': 1,
+    }
     
     # Weights
     EDGE_WEIGHTS = {
@@ -261,6 +406,68 @@ class Node:
     processed: bool = False
     expanded: bool = False
     domains_extracted: bool = False
+    
+    # Отложенное LLM-обогащение: пока enrichment_pending, чтение полей из
+    # ENRICHED_FIELDS сначала вызывает enrich(node) (см. GraphForecasterV6._enrich_nodes).
+    # Сам колбэк не сохраняется при pickle — после загрузки узел остаётся с дефолтами.
+    enrichment_pending: bool = False
+    enrich: Optional[Callable[["Node"], None]] = field(default=None, repr=False, compare=False)
+    
+    ENRICHED_FIELDS = ('description', 'advantages', 'limitations', 'key_concepts',
+                       'dual_use_risk', 'strategic_value', 'legal_risk_score', 'export_control_risk')
+    
+    def peek(self, name: str):
+        """Current value of an enriched field without triggering enrichment."""
+        return self.__dict__[name]
+    
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['enrich'] = None      # bound method of the forecaster — не сериализуем
+        return state
+
+_ENRICHMENT_STATE = threading.local()
+
+@contextmanager
+def _enrichment_suspended():
+    """Within the block, reading enriched fields of pending nodes returns their current values."""
+    depth = getattr(_ENRICHMENT_STATE, 'suspended', 0)
+    _ENRICHMENT_STATE.suspended = depth + 1
+    try:
+        yield
+    finally:
+        _ENRICHMENT_STATE.suspended = depth
+
+def _without_enrichment(method):
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        with _enrichment_suspended():
+            return method(*args, **kwargs)
+    return wrapper
+
+class _EnrichedField:
+    """Node field filled by LLM extraction; reading it on a pending node enriches the node first."""
+    
+    def __init__(self, name: str):
+        self.name = name
+    
+    def __get__(self, node, owner=None):
+        if node is None:
+            return self
+        enrich = node.__dict__.get('enrich')
+        if (enrich is not None and node.__dict__.get('enrichment_pending')
+                and not getattr(_ENRICHMENT_STATE, 'suspended', 0)):
+            enrich(node)
+        return node.__dict__[self.name]
+    
+    def __set__(self, node, value):
+        node.__dict__[self.name] = value
+
+for _name in Node.ENRICHED_FIELDS:
+    setattr(Node, _name, _EnrichedField(_name))
+
+# repr/== сгенерированы dataclass и читают все поля — не должны запускать LLM
+Node.__repr__ = _without_enrichment(Node.__repr__)
+Node.__eq__ = _without_enrichment(Node.__eq__)
 
 @dataclass
 class Edge:
@@ -291,80 +498,1813 @@ class Edge:
 # CACHE & RATE LIMITER (Same as before)
 # ================================================================
 
+class _FileLock:
+    """
+    Exclusive inter-process lock on a side file (fcntl.flock), re-entrant within
+    a thread. Where fcntl is unavailable it degrades to an in-process lock.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._thread_lock = threading.RLock()
+        self._depth = 0
+        self._fd = None
+
+    def __enter__(self):
+        self._thread_lock.acquire()
+        if self._depth == 0 and FCNTL_AVAILABLE:
+            self._fd = open(self.path, 'a+')
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+        self._depth += 1
+        return self
+
+    def __exit__(self, *exc):
+        self._depth -= 1
+        if self._depth == 0 and self._fd is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            self._fd.close()
+            self._fd = None
+        self._thread_lock.release()
+
+
+class _BudgetedStore:
+    """
+    LRU / TTL bookkeeping shared by cache namespaces.
+    Subclasses keep rows in `self._table` with (key, size, created, accessed)
+    columns; budget is a dict with max_entries / max_bytes / ttl_days (None = unlimited).
+
+    Several processes may share one CACHE_DIR: SQLite runs in WAL mode (readers
+    never block the writer, every commit is atomic), writers wait on busy_timeout,
+    and multi-step operations (migration, row allocation, compaction) hold the
+    inter-process `_file_lock`.
+    """
+
+    _TOUCH_FLUSH_EVERY = 256     # сколько обращений копить до записи accessed на диск
+    _EVICT_LOW_WATER   = 0.9     # вытесняем до 90% бюджета, чтобы не дёргаться на каждой вставке
+    _BUSY_TIMEOUT_S    = 30.0
+
+    def _connect(self, db_path: str, table: str, budget: Optional[dict]):
+        self._conn = sqlite3.connect(db_path, timeout=self._BUSY_TIMEOUT_S, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._lock = threading.RLock()
+        self._file_lock = _FileLock(db_path + ".lock")
+        self._table = table
+        self.budget = budget or {}
+        self._touched: Dict[str, float] = {}
+        self._totals: Optional[List[int]] = None   # [entries, bytes], считается лениво
+
+    def _ensure_columns(self, columns: Dict[str, str]) -> bool:
+        """Adds bookkeeping columns to tables created by older versions. True if any were added."""
+        existing = {row[1] for row in self._conn.execute(f"PRAGMA table_info({self._table})")}
+        missing = {name: decl for name, decl in columns.items() if name not in existing}
+        if not missing:
+            return False
+        with self._conn:
+            for name, decl in missing.items():
+                self._conn.execute(f"ALTER TABLE {self._table} ADD COLUMN {name} {decl}")
+            now = time.time()
+            self._conn.execute(f"UPDATE {self._table} SET created = ?, accessed = ? WHERE created = 0", (now, now))
+        return True
+
+    def _is_expired(self, created: float) -> bool:
+        ttl_days = self.budget.get('ttl_days')
+        return ttl_days is not None and time.time() - created > ttl_days * 86400
+
+    def _touch(self, key: str):
+        self._touched[key] = time.time()
+        if len(self._touched) >= self._TOUCH_FLUSH_EVERY:
+            self._flush_touches()
+
+    def _flush_touches(self):
+        with self._lock:
+            if not self._touched:
+                return
+            touched, self._touched = self._touched, {}
+            with self._conn:
+                self._conn.executemany(
+                    f"UPDATE {self._table} SET accessed = ? WHERE key = ?",
+                    ((ts, key) for key, ts in touched.items())
+                )
+
+    def _delete_keys(self, keys: List[str], freed_bytes: Optional[int] = None):
+        """
+        Deletes `keys`. With freed_bytes (total size of those rows) the cached
+        totals are adjusted in place; otherwise they are recounted on next use.
+        """
+        with self._lock, self._conn:
+            removed = self._conn.executemany(f"DELETE FROM {self._table} WHERE key = ?",
+                                             ((k,) for k in keys)).rowcount
+            if self._totals is None:
+                return
+            if freed_bytes is not None and removed == len(keys):
+                self._totals[0] -= removed
+                self._totals[1] -= freed_bytes
+            else:
+                # Строки уже удалил другой процесс — пересчитаем при следующей проверке
+                self._totals = None
+
+    def _over_budget(self, low_water: float = 1.0) -> bool:
+        if self._totals is None:
+            self._totals = list(self._conn.execute(
+                f"SELECT COUNT(*), COALESCE(SUM(size), 0) FROM {self._table}"
+            ).fetchone())
+        max_entries = self.budget.get('max_entries')
+        max_bytes = self.budget.get('max_bytes')
+        return ((max_entries is not None and self._totals[0] > max_entries * low_water) or
+                (max_bytes is not None and self._totals[1] > max_bytes * low_water))
+
+    def _account(self, entries: int, size: int):
+        if self._totals is not None:
+            self._totals[0] += entries
+            self._totals[1] += size
+        if self.budget.get('max_entries') is not None or self.budget.get('max_bytes') is not None:
+            if self._over_budget():
+                self.enforce_budget()
+
+    def purge_expired(self) -> int:
+        ttl_days = self.budget.get('ttl_days')
+        if ttl_days is None:
+            return 0
+        cutoff = time.time() - ttl_days * 86400
+        with self._lock, self._conn:
+            removed = self._conn.execute(f"DELETE FROM {self._table} WHERE created < ?", (cutoff,)).rowcount
+            self._totals = None
+        return removed
+
+    def enforce_budget(self) -> int:
+        """Evicts least recently used entries until the namespace is back under budget."""
+        with self._lock:
+            # Другие процессы тоже пишут — локальные счётчики могли устареть
+            self._totals = None
+            if not self._over_budget():
+                return 0
+            self._flush_touches()
+            max_entries = self.budget.get('max_entries')
+            max_bytes = self.budget.get('max_bytes')
+            excess_entries = self._totals[0] - int(max_entries * self._EVICT_LOW_WATER) if max_entries is not None else 0
+            excess_bytes = self._totals[1] - int(max_bytes * self._EVICT_LOW_WATER) if max_bytes is not None else 0
+
+            victims = []
+            freed = 0
+            for key, size in self._conn.execute(f"SELECT key, size FROM {self._table} ORDER BY accessed"):
+                if len(victims) >= excess_entries and freed >= excess_bytes:
+                    break
+                victims.append(key)
+                freed += size
+            self._delete_keys(victims, freed)
+        logger.info(f"Cache {os.path.basename(self.path)}: evicted {len(victims)} "
+                    f"entries ({freed / 1e6:.1f} MB)")
+        return len(victims)
+
+
+class _SqliteStore(_BudgetedStore):
+    """
+    Key → value namespace on top of a single SQLite table.
+    Each set() writes only its own record in a separate transaction, so inserts
+    cost O(record) instead of re-pickling the whole namespace, and a crash can
+    lose at most the record being written (SQLite rolls it back on next open).
+    """
+
+    def __init__(self, path: str, legacy_path: Optional[str] = None, budget: Optional[dict] = None):
+        self.path = path
+        self._connect(path, "entries", budget)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value BLOB NOT NULL, "
+                "size INTEGER NOT NULL DEFAULT 0, created REAL NOT NULL DEFAULT 0, "
+                "accessed REAL NOT NULL DEFAULT 0)"
+            )
+        with self._file_lock:
+            if self._ensure_columns({
+                "size": "INTEGER NOT NULL DEFAULT 0",
+                "created": "REAL NOT NULL DEFAULT 0",
+                "accessed": "REAL NOT NULL DEFAULT 0",
+            }):
+                with self._conn:
+                    self._conn.execute("UPDATE entries SET size = length(value)")
+            with self._conn:
+                self._conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)")
+
+            # Одноразовая миграция со старого формата (целиком пиклованный dict).
+            # Под file lock: параллельно стартующий процесс увидит, что файла уже нет
+            if legacy_path and os.path.exists(legacy_path):
+                self._import_legacy_pickle(legacy_path)
+
+    def _import_legacy_pickle(self, legacy_path: str):
+        try:
+            with open(legacy_path, 'rb') as f:
+                data = pickle.load(f)
+        except Exception as e:
+            # Типичный случай — обрыв посреди pickle.dump в старой версии
+            logger.warning(f"Legacy cache {legacy_path} is unreadable ({e}), moving it aside")
+            os.replace(legacy_path, legacy_path + ".corrupt")
+            return
+
+        now = time.time()
+        with self._conn:
+            for k, v in data.items():
+                blob = pickle.dumps(v, protocol=pickle.HIGHEST_PROTOCOL)
+                self._conn.execute(
+                    "INSERT OR IGNORE INTO entries (key, value, size, created, accessed) "
+                    "VALUES (?, ?, ?, ?, ?)", (k, blob, len(blob), now, now)
+                )
+        # Переименовываем только после commit — при сбое миграция просто повторится
+        os.replace(legacy_path, legacy_path + ".migrated")
+        logger.info(f"Migrated {len(data)} entries from {legacy_path} to {self.path}")
+        self.enforce_budget()
+
+    def get_blob(self, key: str) -> Optional[bytes]:
+        """Pickled value as stored, or None on miss / expiry."""
+        with self._lock:
+            row = self._conn.execute("SELECT value, created, size FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if self._is_expired(row[1]):
+                self._delete_keys([key], row[2])
+                return None
+            self._touch(key)
+        return row[0]
+
+    def get(self, key: str):
+        blob = self.get_blob(key)
+        return pickle.loads(blob) if blob is not None else None
+
+    def set(self, key: str, value) -> int:
+        """Stores `value` and returns the number of bytes written."""
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        now = time.time()
+        with self._lock:
+            # Одна транзакция: запись конкурирующего процесса либо целиком до, либо после нашей
+            with self._conn:
+                old = self._conn.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO entries (key, value, size, created, accessed) "
+                    "VALUES (?, ?, ?, ?, ?)", (key, blob, len(blob), now, now)
+                )
+            self._touched.pop(key, None)
+            self._account(0 if old else 1, len(blob) - (old[0] if old else 0))
+        return len(blob)
+
+    def compact(self):
+        with self._lock, self._file_lock:
+            self._flush_touches()
+            self.purge_expired()
+            self.enforce_budget()
+            self._conn.execute("VACUUM")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._flush_touches()
+            self._conn.close()
+
+class _EmbeddingStore(_BudgetedStore):
+    """
+    Embedding namespace: one contiguous memory-mapped matrix (float32 or float16)
+    plus an SQLite index hash → row. Startup only opens the mapping, get()
+    returns a zero-copy row view, and similarity code can work on `matrix`
+    directly instead of stacking per-node arrays.
+    Evicted rows stay in the file as holes until compact() repacks it.
+
+    Row allocation happens under the inter-process file lock against the
+    n_rows stored in the index, so concurrent writers never hand out the same
+    row. compact() bumps meta 'generation'; a process that sees a newer
+    generation than the one it mapped remaps the file before reading.
+    """
+
+    _INITIAL_ROWS = 1024
+    _IMPORT_CHUNK = 4096   # эмбеддингов на один set_many при миграции старого кэша
+
+    def __init__(self, matrix_path: str, index_path: str, dtype: str = "float32",
+                 legacy_paths: Tuple[str, ...] = (), budget: Optional[dict] = None):
+        self.path = matrix_path
+        self.matrix_path = matrix_path
+        self.index_path = index_path
+        self.dtype = np.dtype(dtype)
+        self.dim: Optional[int] = None
+        self.n_rows = 0
+        self._generation = 0
+        self._mm: Optional[np.memmap] = None
+
+        self._connect(index_path, "rows", budget)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS rows (key TEXT PRIMARY KEY, row INTEGER NOT NULL, "
+                "size INTEGER NOT NULL DEFAULT 0, created REAL NOT NULL DEFAULT 0, "
+                "accessed REAL NOT NULL DEFAULT 0)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT NOT NULL)"
+            )
+
+        with self._file_lock:
+            columns_added = self._ensure_columns({
+                "size": "INTEGER NOT NULL DEFAULT 0",
+                "created": "REAL NOT NULL DEFAULT 0",
+                "accessed": "REAL NOT NULL DEFAULT 0",
+            })
+            with self._conn:
+                self._conn.execute("CREATE INDEX IF NOT EXISTS rows_accessed ON rows (accessed)")
+
+            meta = dict(self._conn.execute("SELECT name, value FROM meta").fetchall())
+            if "dtype" in meta and np.dtype(meta["dtype"]) != self.dtype:
+                logger.warning(f"Embedding store {matrix_path} uses {meta['dtype']}, ignoring requested {dtype}")
+                self.dtype = np.dtype(meta["dtype"])
+            self._refresh()
+            if columns_added and self.dim is not None:
+                with self._conn:
+                    self._conn.execute("UPDATE rows SET size = ?", (self._row_bytes,))
+
+            for legacy_path in legacy_paths:
+                if os.path.exists(legacy_path):
+                    self._import_legacy(legacy_path)
+
+    # --- mapping ---------------------------------------------------------
+
+    @property
+    def _row_bytes(self) -> int:
+        return self.dim * self.dtype.itemsize
+
+    def _grow_file(self, capacity: int):
+        # Только растим: другой процесс мог уже увеличить файл сильнее
+        size = os.path.getsize(self.matrix_path) if os.path.exists(self.matrix_path) else 0
+        if size < capacity * self._row_bytes:
+            with open(self.matrix_path, 'ab') as f:
+                f.truncate(capacity * self._row_bytes)
+
+    def _map(self):
+        size = os.path.getsize(self.matrix_path) if os.path.exists(self.matrix_path) else 0
+        capacity = size // self._row_bytes
+        if capacity < max(self.n_rows, 1):
+            capacity = max(self._INITIAL_ROWS, self.n_rows)
+            self._grow_file(capacity)
+        # Старые view на прежний mmap остаются валидными — файл только растёт
+        self._mm = np.memmap(self.matrix_path, dtype=self.dtype, mode='r+', shape=(capacity, self.dim))
+
+    def _refresh(self):
+        """Re-reads dim / n_rows / generation from the index and remaps if another process changed them."""
+        with self._lock:
+            meta = dict(self._conn.execute("SELECT name, value FROM meta").fetchall())
+            if "dim" not in meta:
+                return
+            generation = int(meta.get("generation", 0))
+            self.n_rows = int(meta.get("n_rows", 0))
+            if (self._mm is None or generation != self._generation or
+                    self.n_rows > self._mm.shape[0]):
+                self.dim = int(meta["dim"])
+                self._generation = generation
+                self._map()
+
+    def _ensure_capacity(self, rows_needed: int):
+        if rows_needed <= self._mm.shape[0]:
+            return
+        capacity = self._mm.shape[0]
+        while capacity < rows_needed:
+            capacity *= 2
+        self._mm.flush()
+        self._grow_file(capacity)
+        self._map()
+
+    # --- legacy import ---------------------------------------------------
+
+    def _import_legacy(self, legacy_path: str):
+        try:
+            if legacy_path.endswith(".pkl"):
+                with open(legacy_path, 'rb') as f:
+                    items = list(pickle.load(f).items())
+            else:
+                # Промежуточный формат: таблица entries(key, pickled ndarray)
+                conn = sqlite3.connect(legacy_path)
+                items = [(k, pickle.loads(v)) for k, v in conn.execute("SELECT key, value FROM entries")]
+                conn.close()
+        except Exception as e:
+            logger.warning(f"Legacy embedding cache {legacy_path} is unreadable ({e}), moving it aside")
+            os.replace(legacy_path, legacy_path + ".corrupt")
+            return
+
+        # Пачками через set_many: один flush и одна транзакция на пачку, а не на эмбеддинг
+        for i in range(0, len(items), self._IMPORT_CHUNK):
+            self.set_many(items[i:i + self._IMPORT_CHUNK])
+        os.replace(legacy_path, legacy_path + ".migrated")
+        logger.info(f"Migrated {len(items)} embeddings from {legacy_path} to {self.matrix_path}")
+
+    # --- API -------------------------------------------------------------
+
+    def row_of(self, key: str) -> Optional[int]:
+        with self._lock:
+            found = self._conn.execute(
+                "SELECT row, created, (SELECT value FROM meta WHERE name = 'generation') "
+                "FROM rows WHERE key = ?", (key,)
+            ).fetchone()
+            if found is None:
+                return None
+            row, created, generation = found
+            if self._is_expired(created):
+                self._delete_keys([key], self._row_bytes)
+                return None
+            if int(generation or 0) != self._generation or row >= self.n_rows:
+                self._refresh()
+            self._touch(key)
+            return row
+
+    def rows_of(self, keys: List[str]) -> Dict[str, int]:
+        with self._lock:
+            # Поколение читается до и после строк: если между ними прошёл compact()
+            # другого процесса, строки могли быть из старой раскладки — читаем заново
+            generation = self._read_generation()
+            while True:
+                found = {}
+                # SQLite ограничивает число параметров в запросе
+                for i in range(0, len(keys), 500):
+                    chunk = keys[i:i + 500]
+                    marks = ",".join("?" * len(chunk))
+                    for key, row, created in self._conn.execute(
+                        f"SELECT key, row, created FROM rows WHERE key IN ({marks})", chunk
+                    ):
+                        if not self._is_expired(created):
+                            found[key] = row
+                after = self._read_generation()
+                if after == generation:
+                    break
+                generation = after
+            for key in found:
+                self._touch(key)
+            if generation != self._generation or (found and max(found.values()) >= self.n_rows):
+                self._refresh()
+        return found
+
+    def _read_generation(self) -> int:
+        row = self._conn.execute("SELECT value FROM meta WHERE name = 'generation'").fetchone()
+        return int(row[0]) if row else 0
+
+    @property
+    def matrix(self) -> np.ndarray:
+        """All stored embeddings, (n_rows, dim), backed by the mapped file."""
+        if self._mm is None:
+            return np.empty((0, 0), dtype=self.dtype)
+        return self._mm[:self.n_rows]
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        with self._lock:
+            row = self.row_of(key)
+            return self._mm[row] if row is not None else None
+
+    def set(self, key: str, vec: np.ndarray) -> int:
+        """Appends `vec` as a new row and returns the number of bytes written (0 if already stored)."""
+        return self.set_many([(key, vec)])
+
+    def set_many(self, items: List[Tuple[str, np.ndarray]]) -> int:
+        """
+        Appends several embeddings under one lock, one flush and one index
+        transaction. Keys already stored are skipped. Returns bytes written.
+        """
+        with self._lock, self._file_lock:
+            self._refresh()
+            keys = [key for key, _ in items]
+            existing = set()
+            for i in range(0, len(keys), 500):
+                chunk = keys[i:i + 500]
+                marks = ",".join("?" * len(chunk))
+                existing.update(k for (k,) in self._conn.execute(
+                    f"SELECT key FROM rows WHERE key IN ({marks})", chunk))
+
+            fresh: Dict[str, np.ndarray] = {}
+            for key, vec in items:
+                # эмбеддинг детерминирован — перезапись не нужна
+                if key not in existing:
+                    fresh[key] = np.asarray(vec).ravel()
+            if not fresh:
+                return 0
+
+            if self.dim is None:
+                self.dim = int(next(iter(fresh.values())).shape[0])
+                with self._conn:
+                    self._conn.executemany(
+                        "INSERT OR REPLACE INTO meta (name, value) VALUES (?, ?)",
+                        [("dim", str(self.dim)), ("dtype", self.dtype.name)]
+                    )
+                self._map()
+            for key in [k for k, v in fresh.items() if v.shape[0] != self.dim]:
+                logger.warning(f"Embedding dim {fresh.pop(key).shape[0]} != store dim {self.dim}, not cached")
+            if not fresh:
+                return 0
+
+            first_row = self.n_rows
+            self._ensure_capacity(first_row + len(fresh))
+            self._mm[first_row:first_row + len(fresh)] = np.stack(list(fresh.values()))
+            self._mm.flush()
+            # Индекс коммитится после записи строк: при сбое строки просто переиспользуются
+            now = time.time()
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO rows (key, row, size, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                    ((key, first_row + i, self._row_bytes, now, now) for i, key in enumerate(fresh))
+                )
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO meta (name, value) VALUES ('n_rows', ?)",
+                    (str(first_row + len(fresh)),)
+                )
+            self.n_rows = first_row + len(fresh)
+            self._account(len(fresh), len(fresh) * self._row_bytes)
+        return len(fresh) * self._row_bytes
+
+    def compact(self):
+        """
+        Drops expired / over-budget rows and repacks the matrix file so that
+        evicted rows stop occupying disk. The new file is written next to the
+        old one and swapped in with os.replace; processes still mapping the old
+        file keep valid views and remap on their next lookup.
+        """
+        with self._lock, self._file_lock:
+            self._flush_touches()
+            self.purge_expired()
+            self.enforce_budget()
+            self._refresh()
+            if self._mm is None:
+                return
+
+            live = self._conn.execute("SELECT key, row FROM rows ORDER BY row").fetchall()
+            tmp_path = self.matrix_path + ".compact"
+            capacity = max(self._INITIAL_ROWS, len(live))
+            packed = np.memmap(tmp_path, dtype=self.dtype, mode='w+', shape=(capacity, self.dim))
+            for new_row, (_, old_row) in enumerate(live):
+                packed[new_row] = self._mm[old_row]
+            packed.flush()
+            del packed
+
+            with self._conn:
+                self._conn.executemany(
+                    "UPDATE rows SET row = ? WHERE key = ?",
+                    ((new_row, key) for new_row, (key, _) in enumerate(live))
+                )
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO meta (name, value) VALUES (?, ?)",
+                    [("n_rows", str(len(live))), ("generation", str(self._generation + 1))]
+                )
+                os.replace(tmp_path, self.matrix_path)
+            self._refresh()
+            self._conn.execute("VACUUM")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM rows").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._flush_touches()
+            if self._mm is not None:
+                self._mm.flush()
+            self._conn.close()
+
+class LatencyHistogram:
+    """
+    Fixed-bucket latency histogram plus a window of recent samples for
+    percentiles. Not locked itself — owners serialize access.
+    """
+
+    BUCKETS_MS = (0.1, 0.5, 1, 5, 10, 50, 100, 500, 1000, 5000)
+
+    def __init__(self, window: int = 1024):
+        self.counts = [0] * (len(self.BUCKETS_MS) + 1)   # последний — всё, что дольше 5 с
+        self.count = 0
+        self.total_s = 0.0
+        self.max_s = 0.0
+        self._recent = deque(maxlen=window)
+
+    def observe(self, seconds: float):
+        ms = seconds * 1000
+        idx = next((i for i, edge in enumerate(self.BUCKETS_MS) if ms <= edge), len(self.BUCKETS_MS))
+        self.counts[idx] += 1
+        self.count += 1
+        self.total_s += seconds
+        self.max_s = max(self.max_s, seconds)
+        self._recent.append(seconds)
+
+    def percentile(self, q: float) -> float:
+        """q-th percentile (0-100) over the recent window, in seconds."""
+        if not self._recent:
+            return 0.0
+        return float(np.percentile(self._recent, q))
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "total_s": self.total_s,
+            "max_s": self.max_s,
+            "p50_s": self.percentile(50),
+            "p95_s": self.percentile(95),
+            "buckets_ms": dict(zip([str(b) for b in self.BUCKETS_MS] + ["inf"], self.counts)),
+        }
+
+
+class CacheStats:
+    """
+    Cache effectiveness counters per (namespace, source): hits, misses, bytes
+    read / written and get / set latency histograms. Thread-safe.
+    source is the search source name for search_results, the model for
+    llm_responses and "embedder" for embeddings.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[Tuple[str, str], Dict[str, int]] = defaultdict(
+            lambda: {"hits": 0, "misses": 0, "bytes_read": 0, "bytes_written": 0, "writes": 0}
+        )
+        self._latency: Dict[Tuple[str, str, str], LatencyHistogram] = defaultdict(LatencyHistogram)
+
+    def record_get(self, namespace: str, source: str, hits: int, misses: int,
+                   nbytes: int, seconds: float):
+        with self._lock:
+            c = self._counters[(namespace, source)]
+            c["hits"] += hits
+            c["misses"] += misses
+            c["bytes_read"] += nbytes
+            self._latency[(namespace, source, "get")].observe(seconds)
+
+    def record_set(self, namespace: str, source: str, nbytes: int, seconds: float):
+        with self._lock:
+            c = self._counters[(namespace, source)]
+            c["writes"] += 1
+            c["bytes_written"] += nbytes
+            self._latency[(namespace, source, "set")].observe(seconds)
+
+    def snapshot(self) -> Dict[str, Dict[str, dict]]:
+        """{namespace: {source: {hits, misses, hit_rate, bytes_*, get_latency, set_latency}}}"""
+        with self._lock:
+            out: Dict[str, Dict[str, dict]] = defaultdict(dict)
+            for (namespace, source), c in self._counters.items():
+                lookups = c["hits"] + c["misses"]
+                out[namespace][source] = {
+                    **c,
+                    "hit_rate": c["hits"] / lookups if lookups else 0.0,
+                    "get_latency": self._latency[(namespace, source, "get")].to_dict(),
+                    "set_latency": self._latency[(namespace, source, "set")].to_dict(),
+                }
+            return dict(out)
+
+    def report(self) -> str:
+        header = (f"{'namespace':<16}{'source':<20}{'hits':>8}{'misses':>8}{'hit%':>7}"
+                  f"{'read MB':>9}{'write MB':>9}{'get p50/p95 ms':>17}{'set p50/p95 ms':>17}{'set total s':>12}")
+        lines = ["Cache report", header, "-" * len(header)]
+        for namespace, sources in sorted(self.snapshot().items()):
+            for source, st in sorted(sources.items()):
+                get_l, set_l = st["get_latency"], st["set_latency"]
+                lines.append(
+                    f"{namespace:<16}{source[:19]:<20}{st['hits']:>8}{st['misses']:>8}"
+                    f"{st['hit_rate'] * 100:>6.1f}%"
+                    f"{st['bytes_read'] / 1e6:>9.2f}{st['bytes_written'] / 1e6:>9.2f}"
+                    f"{get_l['p50_s'] * 1000:>8.2f}/{get_l['p95_s'] * 1000:<8.2f}"
+                    f"{set_l['p50_s'] * 1000:>8.2f}/{set_l['p95_s'] * 1000:<8.2f}"
+                    f"{set_l['total_s']:>12.2f}"
+                )
+        return "\n".join(lines)
+
 class Cache:
-    """Persistent cache for API calls"""
+    """
+    Persistent cache for API calls (one SQLite store per namespace).
+    Namespaces are opened lazily on first access, and lookups go to the on-disk
+    index, so startup cost does not depend on cache size.
+    """
+    
+    NAMESPACES = ("embeddings", "llm_responses", "search_results", "url_checks")
     
-    def __init__(self, cache_dir: str = "./cache"):
+    def __init__(self, cache_dir: str = "./cache", embedding_dtype: str = "float32",
+                 budgets: Optional[Dict[str, dict]] = None):
         self.cache_dir = cache_dir
+        self.embedding_dtype = embedding_dtype
+        self.budgets = budgets or {}
         os.makedirs(cache_dir, exist_ok=True)
         
-        self.embeddings_cache = os.path.join(cache_dir, "embeddings.pkl")
-        self.llm_cache = os.path.join(cache_dir, "llm_responses.pkl")
-        self.search_cache = os.path.join(cache_dir, "search_results.pkl")
+        self.embeddings_cache = os.path.join(cache_dir, f"embeddings.{np.dtype(embedding_dtype).name}")
+        self.llm_cache = os.path.join(cache_dir, "llm_responses.sqlite")
+        self.search_cache = os.path.join(cache_dir, "search_results.sqlite")
+        self.url_check_cache = os.path.join(cache_dir, "url_checks.sqlite")
         
-        self.embeddings = self._load(self.embeddings_cache)
-        self.llm_responses = self._load(self.llm_cache)
-        self.search_results = self._load(self.search_cache)
+        self._embeddings: Optional[_EmbeddingStore] = None
+        self._llm_responses: Optional[_SqliteStore] = None
+        self._search_results: Optional[_SqliteStore] = None
+        self._url_checks: Optional[_SqliteStore] = None
+        # Первое обращение к namespace может прийти из нескольких потоков источников
+        self._open_lock = threading.Lock()
+        
+        self.stats = CacheStats()
+    
+    # *.pkl — формат предыдущих версий, импортируется при первом открытии namespace
+    
+    @property
+    def embeddings(self) -> _EmbeddingStore:
+        if self._embeddings is None:
+            with self._open_lock:
+                if self._embeddings is None:
+                    self._embeddings = _EmbeddingStore(
+                        self.embeddings_cache,
+                        os.path.join(self.cache_dir, "embeddings_index.sqlite"),
+                        dtype=self.embedding_dtype,
+                        legacy_paths=(os.path.join(self.cache_dir, "embeddings.pkl"),
+                                      os.path.join(self.cache_dir, "embeddings.sqlite")),
+                        budget=self.budgets.get("embeddings"),
+                    )
+        return self._embeddings
+    
+    @property
+    def llm_responses(self) -> _SqliteStore:
+        if self._llm_responses is None:
+            with self._open_lock:
+                if self._llm_responses is None:
+                    self._llm_responses = _SqliteStore(self.llm_cache,
+                                                       os.path.join(self.cache_dir, "llm_responses.pkl"),
+                                                       budget=self.budgets.get("llm_responses"))
+        return self._llm_responses
     
-    def _load(self, path: str) -> dict:
-        if os.path.exists(path):
-            with open(path, 'rb') as f:
-                return pickle.load(f)
-        return {}
+    @property
+    def search_results(self) -> _SqliteStore:
+        if self._search_results is None:
+            with self._open_lock:
+                if self._search_results is None:
+                    self._search_results = _SqliteStore(self.search_cache,
+                                                        os.path.join(self.cache_dir, "search_results.pkl"),
+                                                        budget=self.budgets.get("search_results"))
+        return self._search_results
     
-    def _save(self, data: dict, path: str):
-        with open(path, 'wb') as f:
-            pickle.dump(data, f)
+    @property
+    def url_checks(self) -> _SqliteStore:
+        if self._url_checks is None:
+            with self._open_lock:
+                if self._url_checks is None:
+                    self._url_checks = _SqliteStore(self.url_check_cache, budget=self.budgets.get("url_checks"))
+        return self._url_checks
+    
+    def _open_stores(self) -> list:
+        stores = (self._embeddings, self._llm_responses, self._search_results, self._url_checks)
+        return [store for store in stores if store is not None]
+    
+    def _get(self, namespace: str, source: str, key: str):
+        t0 = time.perf_counter()
+        blob = getattr(self, namespace).get_blob(key)
+        self.stats.record_get(namespace, source, int(blob is not None), int(blob is None),
+                              len(blob) if blob is not None else 0, time.perf_counter() - t0)
+        return pickle.loads(blob) if blob is not None else None
+    
+    def _set(self, namespace: str, source: str, key: str, value):
+        t0 = time.perf_counter()
+        nbytes = getattr(self, namespace).set(key, value)
+        self.stats.record_set(namespace, source, nbytes, time.perf_counter() - t0)
     
     def get_embedding(self, text: str) -> Optional[np.ndarray]:
         key = hashlib.md5(text.encode()).hexdigest()
-        return self.embeddings.get(key)
+        t0 = time.perf_counter()
+        embedding = self.embeddings.get(key)
+        self.stats.record_get("embeddings", "embedder", int(embedding is not None), int(embedding is None),
+                              embedding.nbytes if embedding is not None else 0, time.perf_counter() - t0)
+        return embedding
     
     def set_embedding(self, text: str, embedding: np.ndarray):
         key = hashlib.md5(text.encode()).hexdigest()
-        self.embeddings[key] = embedding
-        self._save(self.embeddings, self.embeddings_cache)
+        t0 = time.perf_counter()
+        nbytes = self.embeddings.set(key, embedding)
+        self.stats.record_set("embeddings", "embedder", nbytes, time.perf_counter() - t0)
+    
+    def get_embeddings(self, texts: List[str]) -> List[Optional[np.ndarray]]:
+        """Bulk get_embedding: one index query for all texts, None where missing."""
+        t0 = time.perf_counter()
+        keys = [hashlib.md5(t.encode()).hexdigest() for t in texts]
+        found = self.embeddings.rows_of(keys)
+        matrix = self.embeddings.matrix
+        result = [matrix[found[k]] if k in found else None for k in keys]
+        hits = sum(1 for e in result if e is not None)
+        self.stats.record_get("embeddings", "embedder", hits, len(result) - hits,
+                              sum(e.nbytes for e in result if e is not None), time.perf_counter() - t0)
+        return result
+    
+    def set_embeddings(self, texts: List[str], embeddings: List[np.ndarray]):
+        t0 = time.perf_counter()
+        items = [(hashlib.md5(t.encode()).hexdigest(), e) for t, e in zip(texts, embeddings)]
+        nbytes = self.embeddings.set_many(items)
+        self.stats.record_set("embeddings", "embedder", nbytes, time.perf_counter() - t0)
+    
+    def get_embedding_matrix(self, texts: List[str]) -> Optional[np.ndarray]:
+        """
+        (len(texts), dim) matrix of cached embeddings, or None if any is missing.
+        Consecutive rows come back as a zero-copy slice of the mapped file,
+        otherwise as a single vectorized gather.
+        """
+        t0 = time.perf_counter()
+        keys = [hashlib.md5(t.encode()).hexdigest() for t in texts]
+        found = self.embeddings.rows_of(keys)
+        unique = len(set(keys))
+        if len(found) < unique:
+            self.stats.record_get("embeddings", "matrix", len(found), unique - len(found), 0,
+                                  time.perf_counter() - t0)
+            return None
+        rows = np.fromiter((found[k] for k in keys), dtype=np.int64, count=len(keys))
+        matrix = self.embeddings.matrix
+        if len(rows) and np.all(np.diff(rows) == 1):
+            result = matrix[rows[0]:rows[-1] + 1]
+        else:
+            result = matrix[rows]
+        self.stats.record_get("embeddings", "matrix", unique, 0, result.nbytes, time.perf_counter() - t0)
+        return result
     
     def get_llm_response(self, prompt: str, model: str) -> Optional[str]:
         key = hashlib.md5((prompt + model).encode()).hexdigest()
-        return self.llm_responses.get(key)
+        return self._get("llm_responses", model, key)
     
     def set_llm_response(self, prompt: str, model: str, response: str):
         key = hashlib.md5((prompt + model).encode()).hexdigest()
-        self.llm_responses[key] = response
-        self._save(self.llm_responses, self.llm_cache)
+        self._set("llm_responses", model, key, response)
     
     def get_search_results(self, query: str, source: str) -> Optional[list]:
         key = hashlib.md5((query + source).encode()).hexdigest()
-        return self.search_results.get(key)
+        return self._get("search_results", source, key)
     
     def set_search_results(self, query: str, source: str, results: list):
         key = hashlib.md5((query + source).encode()).hexdigest()
-        self.search_results[key] = results
-        self._save(self.search_results, self.search_cache)
+        self._set("search_results", source, key, results)
+    
+    def get_url_check(self, url: str) -> Optional[dict]:
+        """{'ok': bool, 'checked': unix time} of the last probe of `url`."""
+        return self._get("url_checks", "verifier", hashlib.md5(url.encode()).hexdigest())
+    
+    def set_url_check(self, url: str, ok: bool):
+        self._set("url_checks", "verifier", hashlib.md5(url.encode()).hexdigest(),
+                  {"ok": ok, "checked": time.time()})
+
+    def compact(self):
+        """Purges expired entries, evicts down to budget and reclaims disk space in every namespace."""
+        for store in (getattr(self, ns) for ns in self.NAMESPACES):
+            before = len(store)
+            store.compact()
+            logger.info(f"Compacted {os.path.basename(store.path)}: {before} → {len(store)} entries")
+
+    def flush(self):
+        """Writes buffered access times (LRU order) of every open namespace to disk."""
+        with self._open_lock:
+            for store in self._open_stores():
+                store._flush_touches()
+    
+    def close(self):
+        with self._open_lock:
+            for store in self._open_stores():
+                store.close()
+            self._embeddings = self._llm_responses = self._search_results = self._url_checks = None
+
+def _parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP-date)."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+def _take_with_timeout(make_iter, limit: int, timeout_s: Optional[float]) -> Tuple[list, Optional[Exception]]:
+    """
+    Up to `limit` items from the iterator built by make_iter(), consumed in a
+    daemon thread so a hung generator cannot block the caller past timeout_s.
+    After a timeout the thread requests no further items and closes the
+    iterator; only a call already blocked inside the generator runs on.
+    Returns (items so far, error): the iterator's exception, a TimeoutError, or None.
+    """
+    items: list = []
+    errors: List[Exception] = []
+    done, stop = threading.Event(), threading.Event()
+    lock = threading.Lock()
+    
+    def consume():
+        it = None
+        try:
+            it = iter(make_iter())
+            # stop проверяется до и после каждого next(): после таймаута новых запросов нет
+            while not stop.is_set():
+                try:
+                    item = next(it)
+                except StopIteration:
+                    break
+                if stop.is_set():
+                    break
+                with lock:
+                    items.append(item)
+                    if len(items) >= limit:
+                        break
+        except Exception as e:
+            errors.append(e)
+        finally:
+            close = getattr(it, "close", None)
+            if close is not None:
+                try:
+                    close()
+                except Exception:
+                    pass
+            done.set()
+    
+    threading.Thread(target=consume, daemon=True, name="take-with-timeout").start()
+    if not done.wait(timeout_s):
+        stop.set()   # поток завершится на следующем элементе, результат уже не нужен
+        with lock:
+            return list(items), TimeoutError(f"no complete result within {timeout_s:g}s")
+    return items, errors[0] if errors else None
+
+def _parse_json_items(text: str) -> list:
+    """
+    Items of the JSON array in an LLM response, tolerating a ```json fence, a
+    wrapping object ({"documents": [...]}) and truncation: an array cut off
+    mid-item yields the complete items before the cut.
+    """
+    if not text:
+        return []
+    try:
+        data = json.loads(text)
+    except ValueError:
+        data = None
+    if isinstance(data, list):
+        return data
+    if isinstance(data, dict):
+        if "doc_id" in data:
+            return [data]
+        lists = [v for v in data.values() if isinstance(v, list)]
+        return lists[0] if lists else []
+    
+    # Не разобралось целиком: читаем элементы массива по одному до первой ошибки
+    start = text.find("[")
+    if start < 0:
+        return []
+    decoder = json.JSONDecoder()
+    items, pos = [], start + 1
+    while True:
+        while pos < len(text) and text[pos] in " \t\r\n,":
+            pos += 1
+        if pos >= len(text) or text[pos] == "]":
+            break
+        try:
+            item, pos = decoder.raw_decode(text, pos)
+        except ValueError:
+            break
+        items.append(item)
+    return items
 
 class RateLimiter:
-    """Token bucket rate limiter"""
+    """
+    Token bucket rate limiter (thread-safe: the token is reserved under a lock,
+    the sleep happens outside it). Adapts to throttling: on_throttled() pauses
+    the bucket for Retry-After (or an exponential backoff) and halves the rate;
+    on_success() restores the rate gradually.
+    """
     
-    def __init__(self, requests_per_minute: int = 60):
-        self.rate = requests_per_minute / 60.0
+    def __init__(self, requests_per_minute: int = 60, name: str = "", max_backoff_s: float = 60.0):
+        self.name = name
+        self.base_rate = requests_per_minute / 60.0
+        self.rate = self.base_rate
         self.tokens = requests_per_minute
         self.max_tokens = requests_per_minute
         self.last_update = time.time()
+        self.blocked_until = 0.0
+        self.max_backoff_s = max_backoff_s
+        self.throttled = 0               # всего 429
+        self.calls = 0
+        self.slept_s = 0.0
+        self._consecutive_throttles = 0
+        self._lock = threading.Lock()
     
-    def wait_if_needed(self):
-        now = time.time()
-        elapsed = now - self.last_update
-        self.tokens = min(self.max_tokens, self.tokens + elapsed * self.rate)
-        self.last_update = now
+    def wait_if_needed(self, cost: float = 1.0):
+        """Take `cost` tokens (1 per request; token buckets pass the request's token estimate)."""
+        with self._lock:
+            now = time.time()
+            elapsed = now - self.last_update
+            self.tokens = min(self.max_tokens, self.tokens + elapsed * self.rate)
+            self.last_update = now
+            self.tokens -= cost
+            wait_time = max(-self.tokens / self.rate if self.tokens < 0 else 0.0,
+                            self.blocked_until - now)
+            self.calls += 1
+            self.slept_s += max(wait_time, 0.0)
         
-        if self.tokens < 1:
-            wait_time = (1 - self.tokens) / self.rate
-            logger.debug(f"Rate limit: waiting {wait_time:.2f}s")
+        if wait_time > 0:
+            logger.debug(f"Rate limit {self.name}: waiting {wait_time:.2f}s")
             time.sleep(wait_time)
-            self.tokens = 1
+    
+    def on_throttled(self, retry_after: Optional[float] = None) -> float:
+        """Register a 429; returns the pause applied to the bucket in seconds."""
+        with self._lock:
+            self.throttled += 1
+            self._consecutive_throttles += 1
+            if retry_after is None:
+                backoff = min(self.max_backoff_s, 2.0 ** (self._consecutive_throttles - 1))
+                retry_after = backoff * random.uniform(0.5, 1.0)
+            retry_after = min(retry_after, self.max_backoff_s * 5)
+            self.blocked_until = max(self.blocked_until, time.time() + retry_after)
+            self.rate = max(self.base_rate / 16, self.rate / 2)
+            self.tokens = min(self.tokens, 0)
+        logger.warning(f"Rate limit {self.name}: throttled, pausing {retry_after:.1f}s, "
+                       f"rate now {self.rate * 60:.0f}/min")
+        return retry_after
+    
+    def on_success(self):
+        with self._lock:
+            self._consecutive_throttles = 0
+            if self.rate < self.base_rate:
+                self.rate = min(self.base_rate, self.rate + self.base_rate * 0.1)
+
+class RateLimiterRegistry:
+    """Independent RateLimiter per key (source name, host or "llm:<model>"), created on first use."""
+    
+    def __init__(self, limits: Dict[str, int]):
+        self.limits = dict(limits)
+        self._limiters: Dict[str, RateLimiter] = {}
+        self._lock = threading.Lock()
+    
+    def get(self, key: str) -> RateLimiter:
+        with self._lock:
+            limiter = self._limiters.get(key)
+            if limiter is None:
+                rpm = self.limits.get(key) or self.limits.get(key.split(":", 1)[0]) \
+                    or self.limits.get('default', 60)
+                limiter = self._limiters[key] = RateLimiter(rpm, name=key)
+            return limiter
+    
+    def snapshot(self) -> Dict[str, dict]:
+        with self._lock:
+            return {key: {"rate_per_min": round(l.rate * 60, 1), "throttled": l.throttled,
+                          "calls": l.calls, "slept_s": l.slept_s}
+                    for key, l in self._limiters.items()}
+    
+    def report(self, wall_s: Optional[float] = None) -> str:
+        """
+        Pacing report: network calls, sleep and 429s per bucket. Sleeps of
+        concurrent threads overlap, so the total is in thread-seconds.
+        """
+        snapshot = self.snapshot()
+        header = f"{'bucket':<32}{'calls':>8}{'slept s':>10}{'429':>6}{'rate/min':>10}"
+        lines = ["Pacing report", header, "-" * len(header)]
+        for key, st in sorted(snapshot.items(), key=lambda kv: -kv[1]["slept_s"]):
+            lines.append(f"{key[:31]:<32}{st['calls']:>8}{st['slept_s']:>10.2f}"
+                         f"{st['throttled']:>6}{st['rate_per_min']:>10.1f}")
+        slept = sum(st["slept_s"] for st in snapshot.values())
+        if wall_s is not None:
+            lines.append(f"wall {wall_s:.1f}s, sleeping {slept:.1f} thread-s "
+                         f"({slept / max(wall_s, 1e-9) * 100:.0f}% of wall), working {max(wall_s - slept, 0.0):.1f}s")
+        else:
+            lines.append(f"sleeping {slept:.1f} thread-s")
+        return "\n".join(lines)
+
+# ================================================================
+# SINGLE-FLIGHT
+# ================================================================
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key: the first caller runs the
+    function, callers arriving while it is in flight wait for its result
+    (or exception) instead of repeating the work. Keys are not remembered
+    after the call completes — that is the cache's job.
+    """
+    
+    def __init__(self):
+        self._calls: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self.coalesced = 0               # вызовов, дождавшихся чужого результата
+    
+    def claim(self, key: str) -> Tuple[Future, bool]:
+        """
+        (future, leader). The leader must complete the future and then call
+        release(key); other callers wait on future.result().
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return future, False
+            future = self._calls[key] = Future()
+            return future, True
+    
+    def release(self, key: str):
+        with self._lock:
+            self._calls.pop(key, None)
+    
+    def do(self, key: str, fn, *args, **kwargs) -> Tuple[Any, bool]:
+        """(result, shared): shared is True when another caller's result was reused."""
+        future, leader = self.claim(key)
+        if not leader:
+            return future.result(), True
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result, False
+        finally:
+            self.release(key)
+
+# ================================================================
+# LLM EXECUTOR
+# ================================================================
+
+class LLMExecutor:
+    """
+    Bounded parallel executor for chat completions. At most max_in_flight
+    requests are on the wire at once, whichever thread issues them. Each
+    request waits on its model's request bucket ("llm:<model>") and token
+    bucket ("llm_tokens:<model>", charged with a prompt estimate plus
+    max_tokens). A 429 pauses the request bucket for Retry-After; timeouts,
+    connection errors and 5xx are retried with jittered exponential backoff.
+    submit()/map() run callables on the executor's pool and return futures.
+    """
+    
+    TRANSIENT_STATUS = {408, 409, 500, 502, 503, 504}
+    
+    def __init__(self, client, rate_limits: RateLimiterRegistry, max_in_flight: int = 8,
+                 max_retries: int = 4, backoff_s: float = 1.0, max_backoff_s: float = 30.0):
+        self.client = client
+        self.rate_limits = rate_limits
+        self.max_retries = max_retries
+        self.backoff_s = backoff_s
+        self.max_backoff_s = max_backoff_s
+        self.retried = 0                 # повторов после временных ошибок (без 429)
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+        self._pool = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="llm")
+    
+    def complete(self, **kwargs) -> str:
+        """Blocking chat completion with budgets and retries; raises after the last attempt."""
+        model = kwargs["model"]
+        requests_bucket = self.rate_limits.get(f"llm:{model}")
+        tokens_bucket = self.rate_limits.get(f"llm_tokens:{model}")
+        # ~4 символа на токен; лимит провайдера учитывает и max_tokens ответа
+        cost = sum(len(m["content"]) for m in kwargs["messages"]) / 4 + kwargs.get("max_tokens", 0)
         
-        self.tokens -= 1
+        for attempt in range(self.max_retries + 1):
+            requests_bucket.wait_if_needed()
+            tokens_bucket.wait_if_needed(cost)
+            try:
+                with self._slots:
+                    response = self.client.chat.completions.create(**kwargs)
+                requests_bucket.on_success()
+                return response.choices[0].message.content
+            
+            except Exception as e:
+                status = getattr(e, "status_code", None)
+                if attempt >= self.max_retries:
+                    raise
+                if status == 429:
+                    headers = getattr(getattr(e, "response", None), "headers", None) or {}
+                    requests_bucket.on_throttled(_parse_retry_after(headers.get("retry-after")))
+                    continue
+                if status in self.TRANSIENT_STATUS or isinstance(e, APIConnectionError):
+                    delay = min(self.max_backoff_s, self.backoff_s * 2 ** attempt) * random.uniform(0.5, 1.0)
+                    self.retried += 1
+                    logger.warning(f"LLM {model}: {e}; retry {attempt + 1}/{self.max_retries} in {delay:.1f}s")
+                    time.sleep(delay)
+                    continue
+                raise
+    
+    def submit(self, fn, *args, **kwargs) -> Future:
+        """Run fn on the LLM pool. fn must not itself wait on futures from this pool."""
+        return self._pool.submit(fn, *args, **kwargs)
+    
+    def map(self, fn, *iterables) -> List:
+        """Submit fn over the iterables in bulk and wait; results in input order."""
+        futures = [self._pool.submit(fn, *args) for args in zip(*iterables)]
+        return [f.result() for f in futures]
+
+# ================================================================
+# HTTP CLIENT
+# ================================================================
+
+class HttpClient:
+    """
+    Shared HTTP layer for every REST source: one pooled keep-alive
+    requests.Session per host, default (connect, read) timeouts and a
+    default User-Agent. Thread-safe; sessions are created on first use.
+    With `rate_limits`, every request waits on its host's bucket, and
+    429 (or 503 + Retry-After) responses are retried up to max_retries times.
+    With httpx installed, async_client() gives the same defaults for asyncio code.
+    """
+    
+    def __init__(self, connect_timeout: float = 5.0, read_timeout: float = 20.0,
+                 pool_maxsize: int = 16, user_agent: str = "GraphForecasterV6/1.0",
+                 rate_limits: Optional[RateLimiterRegistry] = None, max_retries: int = 3):
+        self.timeout = (connect_timeout, read_timeout)
+        self.pool_maxsize = pool_maxsize
+        self.user_agent = user_agent
+        self.rate_limits = rate_limits
+        self.max_retries = max_retries
+        self._sessions: Dict[str, requests.Session] = {}
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def _host(url: str) -> str:
+        return urlparse(url).netloc.lower()
+    
+    def _session_for(self, url: str) -> requests.Session:
+        host = self._host(url)
+        with self._lock:
+            session = self._sessions.get(host)
+            if session is None:
+                session = requests.Session()
+                adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_maxsize)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                session.headers["User-Agent"] = self.user_agent
+                self._sessions[host] = session
+            return session
+    
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        kwargs.setdefault("timeout", self.timeout)
+        session = self._session_for(url)
+        if self.rate_limits is None:
+            return session.request(method, url, **kwargs)
+        
+        limiter = self.rate_limits.get(self._host(url))
+        for attempt in range(self.max_retries + 1):
+            limiter.wait_if_needed()
+            resp = session.request(method, url, **kwargs)
+            retry_after = _parse_retry_after(resp.headers.get("Retry-After"))
+            if resp.status_code != 429 and not (resp.status_code == 503 and retry_after is not None):
+                limiter.on_success()
+                return resp
+            limiter.on_throttled(retry_after)
+            if attempt < self.max_retries:
+                logger.info(f"HTTP {resp.status_code} from {limiter.name}, retry {attempt + 1}/{self.max_retries}")
+        return resp
+    
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+    
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+    
+    def head(self, url: str, **kwargs) -> requests.Response:
+        return self.request("HEAD", url, **kwargs)
+    
+    def request_many(self, method: str, urls: List[str], max_workers: int = 8,
+                     **kwargs) -> List[Optional[requests.Response]]:
+        """Issue one request per URL concurrently; None where the request raised. Order follows `urls`."""
+        def fetch(url):
+            try:
+                return self.request(method, url, **kwargs)
+            except Exception as e:
+                logger.debug(f"HTTP {method} {url} failed: {e}")
+                return None
+        if len(urls) <= 1:
+            return [fetch(url) for url in urls]
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(urls)), thread_name_prefix="http") as pool:
+            return list(pool.map(fetch, urls))
+    
+    def async_client(self) -> "httpx.AsyncClient":
+        """New httpx.AsyncClient with this client's timeouts and pool size; use as `async with`."""
+        if not HTTPX_AVAILABLE:
+            raise RuntimeError("httpx не установлен — pip install httpx")
+        return httpx.AsyncClient(
+            timeout=httpx.Timeout(self.timeout[1], connect=self.timeout[0]),
+            limits=httpx.Limits(max_keepalive_connections=self.pool_maxsize),
+            headers={"User-Agent": self.user_agent},
+            follow_redirects=True,
+        )
+    
+    def close(self):
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions.clear()
+
+class WebSearchClient:
+    """
+    Shared DuckDuckGo text search. Keeps a small pool of long-lived DDGS
+    sessions reused across queries and threads (one session per concurrent
+    search) instead of opening a session per call; all calls share one rate
+    bucket. text_sites() runs several site: filters concurrently or as one
+    OR-combined query.
+    """
+    
+    def __init__(self, sessions: int = 4, rate_limiter: Optional[RateLimiter] = None, max_workers: int = 5):
+        self.rate_limiter = rate_limiter
+        self.max_workers = max_workers
+        self.sessions_opened = 0
+        self._idle: List[DDGS] = []
+        self._slots = threading.BoundedSemaphore(sessions)
+        self._lock = threading.Lock()
+    
+    def _checkout(self) -> DDGS:
+        self._slots.acquire()
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()
+            self.sessions_opened += 1
+        return DDGS()
+    
+    def _checkin(self, ddgs: DDGS, healthy: bool):
+        if healthy:
+            with self._lock:
+                self._idle.append(ddgs)
+        else:
+            self._close_session(ddgs)   # после ошибки сессию не переиспользуем
+        self._slots.release()
+    
+    @staticmethod
+    def _close_session(ddgs: DDGS):
+        try:
+            ddgs.__exit__(None, None, None)
+        except Exception:
+            pass
+    
+    def text(self, query: str, max_results: int = 10) -> List[dict]:
+        if self.rate_limiter:
+            self.rate_limiter.wait_if_needed()
+        ddgs = self._checkout()
+        healthy = False
+        try:
+            results = list(ddgs.text(query, max_results=max_results) or [])
+            healthy = True
+        except Exception as e:
+            if self.rate_limiter and "ratelimit" in type(e).__name__.lower():
+                self.rate_limiter.on_throttled()
+            raise
+        finally:
+            self._checkin(ddgs, healthy)
+        if self.rate_limiter:
+            self.rate_limiter.on_success()
+        return results
+    
+    def _text_or_error(self, query: str, max_results: int, label: str) -> Tuple[List[dict], Optional[Exception]]:
+        try:
+            return self.text(query, max_results), None
+        except Exception as e:
+            logger.warning(f"Web search ({label}) error for '{query}': {e}")
+            return [], e
+    
+    def text_sites(self, query: str, sites: List[str], max_results_per_site: int,
+                   combine: bool = False) -> List[dict]:
+        """
+        `query` restricted to each "site:..." filter, merged in `sites` order
+        without duplicate URLs. combine=True sends a single
+        "query (site:a OR site:b ...)" request instead of one per site.
+        A failing site is logged and skipped; if every request fails, the
+        first error is raised so the caller can report the source as failed.
+        """
+        if combine:
+            outcomes = [self._text_or_error(f"{query} ({' OR '.join(sites)})",
+                                            max_results_per_site * len(sites), "combined sites")]
+        elif len(sites) <= 1:
+            outcomes = [self._text_or_error(f"{query} {site}", max_results_per_site, site) for site in sites]
+        else:
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(sites)),
+                                    thread_name_prefix="websearch") as pool:
+                outcomes = list(pool.map(
+                    lambda site: self._text_or_error(f"{query} {site}", max_results_per_site, site), sites))
+        
+        errors = [error for _, error in outcomes if error is not None]
+        if errors and len(errors) == len(outcomes):
+            raise errors[0]
+        
+        merged, seen = [], set()
+        for batch, _ in outcomes:
+            for r in batch:
+                if r.get("href") and r["href"] not in seen:
+                    seen.add(r["href"])
+                    merged.append(r)
+        return merged
+    
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for ddgs in idle:
+            self._close_session(ddgs)
+
+class OAuthTokenManager:
+    """
+    OAuth2 client-credentials bearer token shared by all threads: fetched once,
+    reused until `expires_in`, and refreshed in a background thread once it is
+    within refresh_margin_s of expiry, so callers never wait on a refresh.
+    """
+    
+    def __init__(self, http: HttpClient, token_url: str, client_id: str, client_secret: str,
+                 name: str = "oauth", refresh_margin_s: float = 300.0):
+        self.http = http
+        self.token_url = token_url
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.name = name
+        self.refresh_margin_s = refresh_margin_s
+        self.fetches = 0
+        self._token: Optional[str] = None
+        self._expires_at = 0.0
+        self._refreshing = False
+        self._lock = threading.Lock()
+        self._fetch_lock = threading.Lock()    # один запрос токена за раз
+    
+    def _fetch(self) -> str:
+        resp = self.http.post(self.token_url, auth=(self.client_id, self.client_secret),
+                              data={"grant_type": "client_credentials"}, timeout=10)
+        resp.raise_for_status()
+        data = resp.json()
+        token = data.get("access_token")
+        if not token:
+            raise ValueError(f"{self.name}: no access_token in response")
+        expires_in = float(data.get("expires_in", 3600))
+        with self._lock:
+            self._token = token
+            self._expires_at = time.time() + expires_in
+            self.fetches += 1
+        logger.debug(f"{self.name}: new token, expires in {expires_in:.0f}s")
+        return token
+    
+    def _refresh_in_background(self):
+        try:
+            with self._fetch_lock:
+                self._fetch()
+        except Exception as e:
+            logger.warning(f"{self.name}: background token refresh failed: {e}")
+        finally:
+            with self._lock:
+                self._refreshing = False
+    
+    def token(self) -> str:
+        with self._lock:
+            now = time.time()
+            if self._token is not None and now < self._expires_at:
+                if now >= self._expires_at - self.refresh_margin_s and not self._refreshing:
+                    self._refreshing = True
+                    threading.Thread(target=self._refresh_in_background, daemon=True,
+                                     name=f"{self.name}-refresh").start()
+                return self._token
+        with self._fetch_lock:
+            with self._lock:
+                if self._token is not None and time.time() < self._expires_at:
+                    return self._token
+            return self._fetch()
+    
+    def invalidate(self):
+        """Drop the cached token (e.g. after a 401); the next token() call fetches a new one."""
+        with self._lock:
+            self._token = None
+            self._expires_at = 0.0
+
+class UrlVerifier:
+    """
+    URL liveness checks (HEAD, falling back to GET on 405; alive = status < 400).
+    A batch is probed concurrently, results — positive and negative, with
+    separate TTLs — are kept in the persistent cache, and concurrent callers
+    asking for the same URL share one in-flight probe.
+    """
+    
+    def __init__(self, http: HttpClient, cache: Optional["Cache"] = None, timeout: float = 5.0,
+                 max_workers: int = 16, ttl_ok_days: float = 30, ttl_fail_days: float = 1):
+        self.http = http
+        self.cache = cache
+        self.timeout = timeout
+        self.ttl_ok_s = ttl_ok_days * 86400
+        self.ttl_fail_s = ttl_fail_days * 86400
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="verify")
+        self._inflight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+    
+    def _cached(self, url: str) -> Optional[bool]:
+        if not self.cache:
+            return None
+        entry = self.cache.get_url_check(url)
+        if not entry:
+            return None
+        ttl = self.ttl_ok_s if entry["ok"] else self.ttl_fail_s
+        return entry["ok"] if time.time() - entry["checked"] < ttl else None
+    
+    def _probe(self, url: str) -> bool:
+        try:
+            try:
+                resp = self.http.head(url, timeout=self.timeout, allow_redirects=True,
+                                      headers={"User-Agent": "Mozilla/5.0"})
+                if resp.status_code == 405:   # HEAD не поддерживается
+                    resp = self.http.get(url, timeout=self.timeout, allow_redirects=True, stream=True,
+                                         headers={"User-Agent": "Mozilla/5.0"})
+                    resp.close()
+                ok = resp.status_code < 400
+            except Exception:
+                ok = False
+            if self.cache:
+                self.cache.set_url_check(url, ok)
+            return ok
+        finally:
+            with self._lock:
+                self._inflight.pop(url, None)
+    
+    def verify_many(self, urls: List[str]) -> Dict[str, bool]:
+        """{url: alive} for every distinct URL in `urls`."""
+        results: Dict[str, bool] = {}
+        pending = {}
+        for url in dict.fromkeys(urls):
+            cached = self._cached(url)
+            if cached is not None:
+                results[url] = cached
+                continue
+            with self._lock:
+                future = self._inflight.get(url)
+                if future is None:
+                    future = self._inflight[url] = self._pool.submit(self._probe, url)
+            pending[url] = future
+        for url, future in pending.items():
+            results[url] = future.result()
+        return results
+    
+    def verify(self, url: str) -> bool:
+        return self.verify_many([url])[url]
+    
+    def close(self):
+        self._pool.shutdown(wait=False)
+
+# ================================================================
+# SOURCE HEALTH
+# ================================================================
+
+class SourceHealth:
+    """
+    Per-source circuit breaker and latency tracker. A source that fails
+    failure_threshold times in a row is opened (skipped); after cooldown_s one
+    half-open probe call is let through, and its outcome closes or re-opens
+    the circuit. Latency percentiles feed the scheduler in
+    _execute_multi_source_queries. Thread-safe.
+    """
+    
+    def __init__(self, failure_threshold: int = 3, cooldown_s: float = 120.0):
+        self.failure_threshold = failure_threshold
+        self.cooldown_s = cooldown_s
+        self._lock = threading.Lock()
+        self._sources: Dict[str, dict] = {}
+    
+    def _entry(self, name: str) -> dict:
+        entry = self._sources.get(name)
+        if entry is None:
+            entry = self._sources[name] = {
+                "state": "closed", "failures": 0, "opened_at": 0.0, "probing": False,
+                "calls": 0, "failed": 0, "skipped": 0, "latency": LatencyHistogram(),
+            }
+        return entry
+    
+    def allow(self, name: str) -> bool:
+        """True if `name` may be called now; counts the call as skipped otherwise."""
+        with self._lock:
+            entry = self._entry(name)
+            if entry["state"] == "open" and time.time() - entry["opened_at"] >= self.cooldown_s:
+                entry["state"] = "half_open"
+                entry["probing"] = False
+            if entry["state"] == "half_open" and not entry["probing"]:
+                entry["probing"] = True       # ровно одна пробная попытка
+                return True
+            if entry["state"] != "closed":
+                entry["skipped"] += 1
+                return False
+            return True
+    
+    def skip(self, name: str, allowed: bool = False):
+        """
+        Count a call not made for scheduling reasons (time budget).
+        allowed=True: allow() already passed, so a half-open probe it granted is given back.
+        """
+        with self._lock:
+            entry = self._entry(name)
+            entry["skipped"] += 1
+            if allowed and entry["state"] == "half_open":
+                entry["probing"] = False
+    
+    def record(self, name: str, seconds: float, ok: bool):
+        with self._lock:
+            entry = self._entry(name)
+            entry["latency"].observe(seconds)
+            entry["calls"] += 1
+            entry["probing"] = False
+            if ok:
+                entry["failures"] = 0
+                if entry["state"] != "closed":
+                    logger.info(f"Source {name}: circuit closed")
+                entry["state"] = "closed"
+                return
+            entry["failed"] += 1
+            entry["failures"] += 1
+            if entry["state"] == "half_open" or entry["failures"] >= self.failure_threshold:
+                if entry["state"] != "open":
+                    logger.warning(f"Source {name}: circuit open after {entry['failures']} failures, "
+                                   f"retry in {self.cooldown_s:.0f}s")
+                entry["state"] = "open"
+                entry["opened_at"] = time.time()
+    
+    def p95(self, name: str) -> float:
+        with self._lock:
+            return self._entry(name)["latency"].percentile(95)
+    
+    def is_open(self, name: str) -> bool:
+        """True while `name` is not closed (read-only, unlike allow())."""
+        with self._lock:
+            return self._entry(name)["state"] != "closed"
+    
+    def snapshot(self) -> Dict[str, dict]:
+        with self._lock:
+            return {name: {"state": e["state"], "calls": e["calls"], "failed": e["failed"],
+                           "skipped": e["skipped"], "p50_s": e["latency"].percentile(50),
+                           "p95_s": e["latency"].percentile(95)}
+                    for name, e in self._sources.items()}
+    
+    def report(self) -> str:
+        header = f"{'source':<18}{'state':>10}{'calls':>7}{'failed':>8}{'skipped':>9}{'p50 s':>8}{'p95 s':>8}"
+        lines = ["Source health", header, "-" * len(header)]
+        for name, st in sorted(self.snapshot().items()):
+            lines.append(f"{name:<18}{st['state']:>10}{st['calls']:>7}{st['failed']:>8}{st['skipped']:>9}"
+                         f"{st['p50_s']:>8.2f}{st['p95_s']:>8.2f}")
+        return "\n".join(lines)
+
+# ================================================================
+# SIMILARITY HELPERS
+# ================================================================
+
+def _normalize_rows(embeddings: np.ndarray) -> np.ndarray:
+    """float32 copy of `embeddings` with unit-norm rows (zero rows stay zero)."""
+    x = np.asarray(embeddings, dtype=np.float32)
+    norms = np.linalg.norm(x, axis=1, keepdims=True)
+    return x / np.maximum(norms, 1e-12)
+
+def _similar_pairs_blocked(embeddings: np.ndarray, threshold: float, tile_size: int = 2048,
+                           query_ids: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    All pairs i < j with cosine similarity > threshold, as (i, j, sim) arrays.
+    Works on tile_size × tile_size float32 blocks of the upper triangle, so
+    peak extra memory is O(tile_size²) instead of an n×n float64 matrix.
+    With `query_ids` only pairs touching those rows are computed (query × all).
+    """
+    x = _normalize_rows(embeddings)
+    n = x.shape[0]
+    rows, cols, sims = [], [], []
+
+    if query_ids is None:
+        for r0 in range(0, n, tile_size):
+            r1 = min(r0 + tile_size, n)
+            for c0 in range(r0, n, tile_size):
+                c1 = min(c0 + tile_size, n)
+                block = x[r0:r1] @ x[c0:c1].T
+                mask = block > threshold
+                if c0 == r0:
+                    mask = np.triu(mask, k=1)   # диагональный блок: только j > i
+                bi, bj = np.nonzero(mask)
+                if bi.size:
+                    rows.append(bi + r0)
+                    cols.append(bj + c0)
+                    sims.append(block[bi, bj])
+    else:
+        query_ids = np.asarray(query_ids, dtype=np.int64)
+        is_query = np.zeros(n, dtype=bool)
+        is_query[query_ids] = True
+        for r0 in range(0, len(query_ids), tile_size):
+            q = query_ids[r0:r0 + tile_size]
+            for c0 in range(0, n, tile_size):
+                c1 = min(c0 + tile_size, n)
+                block = x[q] @ x[c0:c1].T
+                col_ids = np.arange(c0, c1)
+                # пары query × query считаем один раз (j > i), query × остальные — все
+                mask = (block > threshold) & ~(is_query[c0:c1][None, :] & (col_ids[None, :] <= q[:, None]))
+                bi, bj = np.nonzero(mask)
+                if bi.size:
+                    rows.append(np.minimum(q[bi], col_ids[bj]))
+                    cols.append(np.maximum(q[bi], col_ids[bj]))
+                    sims.append(block[bi, bj])
+
+    if not rows:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, np.empty(0, dtype=np.float32)
+    return np.concatenate(rows), np.concatenate(cols), np.concatenate(sims)
+
+class IVFIndex:
+    """
+    Local inverted-file ANN index over unit-normalised embeddings.
+    Spherical k-means splits the vectors into `nlist` cells; a query is only
+    compared against the members of its `nprobe` closest cells, so a lookup
+    costs ~ nprobe/nlist of an exact scan. Recall is traded for speed via
+    nprobe (see benchmark_ann_recall).
+    """
+    
+    def __init__(self, nlist: Optional[int] = None, nprobe: int = 8,
+                 kmeans_iter: int = 10, train_size: int = 64, seed: int = 0):
+        self.nlist = nlist           # None = ~sqrt(n) при build()
+        self.nprobe = nprobe
+        self.kmeans_iter = kmeans_iter
+        self.train_size = train_size  # обучающих точек на ячейку
+        self.seed = seed
+        self.vectors = np.empty((0, 0), dtype=np.float32)
+        self.centroids = np.empty((0, 0), dtype=np.float32)
+        self.lists: List[np.ndarray] = []
+    
+    def __len__(self) -> int:
+        return len(self.vectors)
+    
+    def _assign(self, x: np.ndarray, chunk: int = 8192) -> np.ndarray:
+        return np.concatenate([
+            np.argmax(x[i:i + chunk] @ self.centroids.T, axis=1)
+            for i in range(0, len(x), chunk)
+        ]) if len(x) else np.empty(0, dtype=np.int64)
+    
+    def build(self, embeddings: np.ndarray) -> "IVFIndex":
+        x = _normalize_rows(embeddings)
+        n = len(x)
+        nlist = min(self.nlist or max(int(np.sqrt(n)), 1), max(n, 1))
+        rng = np.random.default_rng(self.seed)
+        
+        # Spherical k-means на подвыборке
+        train = x[rng.choice(n, min(n, nlist * self.train_size), replace=False)] if n else x
+        self.centroids = train[rng.choice(len(train), nlist, replace=False)].copy() if n else x[:0]
+        for _ in range(self.kmeans_iter if n else 0):
+            labels = self._assign(train)
+            for c in range(nlist):
+                members = train[labels == c]
+                if len(members):
+                    self.centroids[c] = members.sum(axis=0)
+                else:   # пустая ячейка — пересеять случайной точкой
+                    self.centroids[c] = train[rng.integers(len(train))]
+            self.centroids = _normalize_rows(self.centroids)
+        
+        self.vectors = x
+        labels = self._assign(x)
+        self.lists = [np.flatnonzero(labels == c) for c in range(len(self.centroids))]
+        return self
+    
+    def add(self, embeddings: np.ndarray) -> np.ndarray:
+        """Append vectors to their nearest cells (centroids stay fixed). Returns their ids."""
+        x = _normalize_rows(embeddings)
+        ids = np.arange(len(self.vectors), len(self.vectors) + len(x))
+        self.vectors = np.vstack([self.vectors, x]) if len(self.vectors) else x
+        for c, members in enumerate(self._group(self._assign(x), ids)):
+            if members.size:
+                self.lists[c] = np.concatenate([self.lists[c], members])
+        return ids
+    
+    def _group(self, labels: np.ndarray, ids: np.ndarray) -> List[np.ndarray]:
+        return [ids[labels == c] for c in range(len(self.centroids))]
+    
+    def _probe(self, x: np.ndarray) -> np.ndarray:
+        """Indices of the nprobe closest cells for each row of x."""
+        nprobe = min(self.nprobe, len(self.centroids))
+        scores = x @ self.centroids.T
+        if nprobe >= scores.shape[1]:
+            return np.tile(np.arange(scores.shape[1]), (len(x), 1))
+        return np.argpartition(-scores, nprobe - 1, axis=1)[:, :nprobe]
+    
+    def search(self, queries: np.ndarray, threshold: Optional[float] = None,
+               k: Optional[int] = None) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Per query: (ids, sims) of indexed vectors with sim >= threshold and/or
+        the top k, sorted by similarity descending.
+        """
+        q = _normalize_rows(np.atleast_2d(queries))
+        results = []
+        for row, cells in zip(q, self._probe(q)):
+            cand = np.concatenate([self.lists[c] for c in cells])
+            sims = self.vectors[cand] @ row
+            if threshold is not None:
+                keep = sims >= threshold
+                cand, sims = cand[keep], sims[keep]
+            order = np.argsort(-sims)[:k]
+            results.append((cand[order], sims[order]))
+        return results
+    
+    def pairs_above(self, threshold: float, query_ids: Optional[np.ndarray] = None,
+                    tile_size: int = 2048) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Approximate (i, j, sim) pairs, i < j, with sim > threshold — either all
+        pairs or only those touching `query_ids`. Queries are processed cell by
+        cell; each cell probes the nprobe cells closest to its centroid.
+        """
+        n = len(self.vectors)
+        if query_ids is None:
+            query_lists = self.lists
+        else:
+            query_lists = self._group(self._assign(self.vectors[query_ids]), np.asarray(query_ids))
+        probes = self._probe(self.centroids)
+        rows, cols, sims = [], [], []
+        
+        for c, members in enumerate(query_lists):
+            if not members.size:
+                continue
+            cand = np.concatenate([self.lists[p] for p in probes[c]])
+            cand_vecs = self.vectors[cand]
+            for t in range(0, len(members), tile_size):
+                q = members[t:t + tile_size]
+                block = self.vectors[q] @ cand_vecs.T
+                bi, bj = np.nonzero(block > threshold)
+                rows.append(q[bi])
+                cols.append(cand[bj])
+                sims.append(block[bi, bj])
+        
+        if not rows:
+            empty = np.empty(0, dtype=np.int64)
+            return empty, empty, np.empty(0, dtype=np.float32)
+        i, j, sim = np.concatenate(rows), np.concatenate(cols), np.concatenate(sims)
+        lo, hi = np.minimum(i, j), np.maximum(i, j)
+        keep = lo != hi
+        # одна и та же пара может найтись из обеих ячеек
+        _, first = np.unique(lo[keep] * n + hi[keep], return_index=True)
+        return lo[keep][first], hi[keep][first], sim[keep][first]
 
 # ================================================================
 # GRAPH FORECASTER V6 - CORRECTED
@@ -375,11 +2315,14 @@ class GraphForecasterV6:
     Exhaustive graph builder with intelligent cross-domain discovery
     """
     
+    UNVERIFIED_MEMORY_MARKER = "[UNVERIFIED MEMORY REF] "   # см. _search_model_memory
+    
     def __init__(self, config: Config = Config()):
         self.config = config
         
         # Initialize LLM and embedder
-        self.client = OpenAI(api_key=config.OPENAI_API_KEY)
+        # Повторы после 429 и временных ошибок делает LLMExecutor (self.llm)
+        self.client = OpenAI(api_key=config.OPENAI_API_KEY, max_retries=0)
         self.embedder = SentenceTransformer(config.EMBEDDING_MODEL)
         
         # Data structures
@@ -391,9 +2334,42 @@ class GraphForecasterV6:
         self.processed_urls: Set[str] = set()
         self.discovered_domains: Set[str] = set()  # NEW: track discovered domains
         
+        # Общее состояние меняется из потоков источников (см. _execute_multi_source_queries)
+        self._state_lock = threading.RLock()
+        self._embed_lock = threading.Lock()
+        self._source_ctx = threading.local()      # ошибка / режим сбора текущего вызова источника, см. _run_source
+        # Одинаковые промпты в полёте выполняются один раз (ключ как в Cache), см. _call_llm.
+        # Для поиска не нужно: _claim_query уже исключает повтор пары (запрос, источник)
+        self._llm_flights = SingleFlight()
+        # Документ в полёте внутри чужого пакета извлечения — ждём его, а не шлём снова
+        # (ключ — одиночный промпт), см. _extract_nodes_data
+        self._extraction_flights = SingleFlight()
+        self.source_health = SourceHealth(config.SOURCE_HEALTH.get('failure_threshold', 3),
+                                          config.SOURCE_HEALTH.get('cooldown_s', 120.0))
+        self._source_slots = {
+            name: threading.BoundedSemaphore(
+                config.SOURCE_CONCURRENCY.get(name, config.SOURCE_CONCURRENCY.get('default', 2)))
+            for name, _ in self._search_sources()
+        }
+        
         # Utilities
-        self.cache = Cache(config.CACHE_DIR) if config.ENABLE_CACHE else None
-        self.rate_limiter = RateLimiter(config.REQUESTS_PER_MINUTE)
+        self.cache = Cache(config.CACHE_DIR, config.EMBEDDING_CACHE_DTYPE,
+                           config.CACHE_BUDGETS) if config.ENABLE_CACHE else None
+        if self.cache:
+            # Кэш не закрывается явно — иначе последние обращения не дойдут до LRU
+            atexit.register(self.cache.flush)
+        self.rate_limits = RateLimiterRegistry(config.RATE_LIMITS)
+        self.http = HttpClient(**config.HTTP_SETTINGS, rate_limits=self.rate_limits,
+                               max_retries=config.RATE_LIMIT_RETRIES['http'])
+        self.llm = LLMExecutor(self.client, self.rate_limits,
+                               max_retries=config.RATE_LIMIT_RETRIES['llm'], **config.LLM_EXECUTOR)
+        self.url_verifier = UrlVerifier(self.http, self.cache, **config.URL_VERIFY)
+        self.web_search = WebSearchClient(config.WEB_SEARCH.get('sessions', 4),
+                                          self.rate_limits.get("duckduckgo"))
+        self.reddit_auth = OAuthTokenManager(
+            self.http, "https://www.reddit.com/api/v1/access_token",
+            config.REDDIT_CLIENT_ID, config.REDDIT_CLIENT_SECRET, name="reddit",
+        ) if config.REDDIT_CLIENT_ID and config.REDDIT_CLIENT_SECRET else None
         self.scaler = MinMaxScaler()
         
         # Crossref client
@@ -402,6 +2378,17 @@ class GraphForecasterV6:
         # State
         self.target_problem = ""
         self.problem_tree = {}
+        self._target_unit: Optional[np.ndarray] = None   # см. _target_unit_vector
+        self._target_unit_for = None
+        self._ann_index: Optional[IVFIndex] = None        # см. _node_ann_index
+        self._ann_built_size = 0
+        
+        # Инкрементальное построение рёбер (см. _auto_connect_nodes)
+        self._connected_node_ids: Set[str] = set()
+        self._edge_keys: Set[Tuple[str, str]] = set()
+        
+        # Счётчики пакетного извлечения (см. _extract_nodes_data, _extraction_report)
+        self.extraction_stats: Dict[str, int] = defaultdict(int)
 
         # Sentiment pipelines (загружаются лениво при первом вызове)
         self._sentiment_review_pipe  = None   # nlptown review model
@@ -419,6 +2406,7 @@ class GraphForecasterV6:
         logger.info(f"Target: {target}")
         
         self.target_problem = target
+        self._target_unit_vector()
         
         prompt = f"""
         Perform deep analysis of this technology target:
@@ -461,23 +2449,56 @@ class GraphForecasterV6:
     # ================================================================
     
     def _auto_connect_nodes(self, threshold=0.48):
+        """
+        Semantic edges between node pairs above `threshold`, incrementally:
+        only nodes not yet connected are compared, against all nodes (new × all).
+        Similarity is computed in EDGE_TILE_SIZE blocks (see _similar_pairs_blocked),
+        or approximately through the IVF index on large graphs.
+        """
         nodes = list(self.nodes.values())
-        embeddings = np.array([n.embedding for n in nodes])
-        sim_matrix = cosine_similarity(embeddings)
+        new_ids = np.array([i for i, n in enumerate(nodes) if n.id not in self._connected_node_ids],
+                           dtype=np.int64)
+        if len(nodes) < 2 or not new_ids.size:
+            return
+        # Первый проход — обычный all-pairs по верхнему треугольнику
+        query_ids = None if len(new_ids) == len(nodes) else new_ids
+        
+        embeddings = self._embedding_matrix(nodes)
+        index = self._node_ann_index(embeddings)
+        if index is not None:
+            rows, cols, sims = index.pairs_above(threshold, query_ids=query_ids,
+                                                 tile_size=self.config.EDGE_TILE_SIZE)
+        else:
+            rows, cols, sims = _similar_pairs_blocked(embeddings, threshold, self.config.EDGE_TILE_SIZE,
+                                                      query_ids=query_ids)
+        
+        added = self._add_edges(
+            Edge(source=nodes[i].id, target=nodes[j].id,
+                 semantic_similarity=sim, confidence=sim)
+            for i, j, sim in zip(rows.tolist(), cols.tolist(), sims.tolist())
+        )
+        self._connected_node_ids.update(nodes[i].id for i in new_ids.tolist())
+        logger.info(f"Auto-connect: {added} new semantic edges, "
+                    f"{len(new_ids)} new × {len(nodes)} nodes")
     
-        for i in range(len(nodes)):
-            for j in range(i+1, len(nodes)):
-                if sim_matrix[i,j] > threshold:
-                    edge = Edge(source=nodes[i].id, target=nodes[j].id, 
-                              semantic_similarity=sim_matrix[i,j],
-                              confidence=sim_matrix[i,j])
-                    self.edges.append(edge)
+    def _add_edges(self, edges) -> int:
+        """Append edges, skipping any (source, target) pair already in the graph."""
+        added = 0
+        for edge in edges:
+            key = (edge.source, edge.target)
+            if key in self._edge_keys:
+                continue
+            self._edge_keys.add(key)
+            self.edges.append(edge)
+            added += 1
+        return added
 
     def ingest_all_sources(self, depth: int = 3):
         """
         Comprehensive ingestion from ALL available sources
         """
         logger.info(f"STAGE 1: Multi-source exhaustive ingestion (depth={depth})")
+        run_started = time.perf_counter()
         
         # Level 0: Direct queries about target
         level_0_queries = self._generate_comprehensive_queries(self.target_problem, "direct")
@@ -507,12 +2528,26 @@ class GraphForecasterV6:
             
             new_nodes_this_level = []
             
+            # Selected nodes are enriched in one batched pass (lazy nodes were created
+            # without LLM extraction); expansion queries of the next few nodes are
+            # generated ahead, so extraction is not queued behind the whole level
+            self._enrich_nodes(previous_nodes)
+            to_prefetch = deque(node for node in previous_nodes if not node.expanded)
+            query_futures: Dict[str, Future] = {}
+            
+            def prefetch_queries():
+                while to_prefetch and len(query_futures) < max(1, self.config.EXPANSION_QUERY_PREFETCH):
+                    next_node = to_prefetch.popleft()
+                    query_futures[next_node.id] = self.llm.submit(self._generate_expansion_queries, next_node)
+            
+            prefetch_queries()
             for node in tqdm(previous_nodes, desc=f"Depth {current_depth}"):
                 if node.expanded:
                     continue
                 
                 # Generate expansion queries from this node
-                expansion_queries = self._generate_expansion_queries(node)
+                expansion_queries = query_futures.pop(node.id).result()
+                prefetch_queries()
                 
                 # Execute across all sources
                 new_nodes = self._execute_multi_source_queries(
@@ -526,8 +2561,6 @@ class GraphForecasterV6:
                 
                 # Extract domains from new nodes
                 self._extract_domains_from_nodes(new_nodes)
-                
-                time.sleep(self.config.DELAY_BETWEEN_REQUESTS)
             
             logger.info(f"Depth {current_depth}: {len(new_nodes_this_level)} new nodes")
             all_new_nodes.extend(new_nodes_this_level)
@@ -546,72 +2579,157 @@ class GraphForecasterV6:
             self._extract_domains_from_nodes(unextracted)
 
         self._auto_connect_nodes()
+        
+        # Сколько времени ушло на паузы rate limit'ов против полезной работы
+        logger.info("\n" + self.rate_limits.report(time.perf_counter() - run_started))
+        logger.info("\n" + self.source_health.report())
+        logger.info("\n" + self._extraction_report())
+        if self.cache:
+            self.cache.flush()
+            logger.info("\n" + self.cache.stats.report())
+        logger.info(f"Coalesced in-flight duplicate LLM prompts: {self._llm_flights.coalesced}")
 
         return all_new_nodes
     
-    def _execute_multi_source_queries(self, queries: List[str], depth: int, parent_node: Optional[Node] = None) -> List[Node]:
+    def _search_sources(self) -> List[Tuple[str, callable]]:
+        """All search sources in their fixed result order: (name, search(query, depth, parent_node))."""
+        return [
+            ("arxiv",            self._search_arxiv),             # Source 1: arXiv
+            ("semantic_scholar", self._search_semantic_scholar),  # Source 2: Semantic Scholar
+            ("crossref",         self._search_crossref),          # Source 3: Crossref (general academic)
+            ("pubmed",           self._search_pubmed),            # Source 4: PubMed (biomedical)
+            ("google_scholar",   self._search_google_scholar),    # Source 5: Google Scholar (via scholarly)
+            ("patents",          self._search_patents),           # Source 6: Patents (Google Patents via web search)
+            ("github",           self._search_github),            # Source 7: GitHub
+            ("web",              self._search_web),               # Source 8: General Web
+            ("researchgate",     self._search_researchgate),      # Source 9: ResearchGate (web scraping + link verification)
+            ("forums",           self._search_forums),            # Source 10: Форумы (Reddit, HackerNews, StackExchange)
+            ("investment",       self._fetch_investment_data),    # Source 11: Инвестиционные данные (заглушки)
+            ("model_memory",     self._search_model_memory),      # Source 12: Память модели + верификация ссылок
+        ]
+    
+    def _claim_url(self, url: str) -> bool:
         """
-        Execute queries across ALL available sources
+        Atomically mark `url` as processed. False if another source already took it.
+        Inside a source call of _execute_multi_source_queries only URLs of earlier
+        batches are rejected; the batch claims its candidates afterwards in source order.
         """
-        new_nodes = []
-        
-        for query in queries:
+        with self._state_lock:
+            if url in self.processed_urls:
+                return False
+            if not getattr(self._source_ctx, 'collecting', False):
+                self.processed_urls.add(url)
+            return True
+    
+    def _claim_query(self, query: str) -> bool:
+        """Atomically add `query` to query_history. False if it was already run."""
+        with self._state_lock:
             if query in self.query_history:
-                continue
-            
+                return False
             self.query_history.add(query)
-            
-            # Source 1: arXiv
-            nodes_arxiv = self._search_arxiv(query, depth, parent_node)
-            new_nodes.extend(nodes_arxiv)
-            
-            # Source 2: Semantic Scholar
-            nodes_semantic = self._search_semantic_scholar(query, depth, parent_node)
-            new_nodes.extend(nodes_semantic)
-            
-            # Source 3: Crossref (general academic)
-            nodes_crossref = self._search_crossref(query, depth, parent_node)
-            new_nodes.extend(nodes_crossref)
-            
-            # Source 4: PubMed (biomedical)
-            nodes_pubmed = self._search_pubmed(query, depth, parent_node)
-            new_nodes.extend(nodes_pubmed)
-            
-            # Source 5: Google Scholar (via scholarly)
-            nodes_scholar = self._search_google_scholar(query, depth, parent_node)
-            new_nodes.extend(nodes_scholar)
-            
-            # Source 6: Patents (Google Patents via web search)
-            nodes_patents = self._search_patents(query, depth, parent_node)
-            new_nodes.extend(nodes_patents)
-            
-            # Source 7: GitHub
-            nodes_github = self._search_github(query, depth, parent_node)
-            new_nodes.extend(nodes_github)
-            
-            # Source 8: General Web
-            nodes_web = self._search_web(query, depth, parent_node)
-            new_nodes.extend(nodes_web)
-
-            # Source 9: ResearchGate (web scraping + link verification)
-            nodes_rg = self._search_researchgate(query, depth, parent_node)
-            new_nodes.extend(nodes_rg)
-
-            # Source 10: Форумы (Reddit, HackerNews, StackExchange)
-            nodes_forums = self._search_forums(query, depth, parent_node)
-            new_nodes.extend(nodes_forums)
-
-            # Source 11: Инвестиционные данные (заглушки)
-            nodes_invest = self._fetch_investment_data(query, depth, parent_node)
-            new_nodes.extend(nodes_invest)
-
-            # Source 12: Память модели + верификация ссылок
-            nodes_memory = self._search_model_memory(query, depth, parent_node)
-            new_nodes.extend(nodes_memory)
-            
-            self.rate_limiter.wait_if_needed()
+            return True
+    
+    def _pace(self, source: str):
+        """Wait on `source`'s rate bucket; call only right before a real network request."""
+        self.rate_limits.get(source).wait_if_needed()
+    
+    def _cached_search_results(self, query: str, source: str, pace: bool = True) -> Optional[list]:
+        """
+        Cached results of `source` for `query`. On a miss the source's bucket is
+        paced (a network call follows), so warm-cache runs never sleep.
+        pace=False for sources whose calls are already paced per host / LLM model
+        (HttpClient, WebSearchClient, _call_llm).
+        """
+        if self.cache:
+            cached = self.cache.get_search_results(query, source)
+            if cached:
+                return cached
+        if pace:
+            self._pace(source)
+        return None
+    
+    def _source_error(self, error: Exception):
+        """Mark the source call running on this thread as failed (for SourceHealth)."""
+        self._source_ctx.error = error
+    
+    def _run_source(self, name: str, search, query: str, depth: int, parent_node: Optional[Node],
+                    deadline: Optional[float] = None) -> List[Node]:
+        """
+        One source call under its concurrency slot; a failing source yields no nodes.
+        Skipped while the source's circuit is open or once `deadline` (monotonic) has
+        passed, also if it passed while waiting for the slot.
+        """
+        if deadline is not None and time.monotonic() > deadline:
+            self.source_health.skip(name)
+            return []
+        if not self.source_health.allow(name):
+            return []
+        with self._source_slots[name]:
+            if deadline is not None and time.monotonic() > deadline:
+                self.source_health.skip(name, allowed=True)
+                return []
+            self._source_ctx.error = None
+            # Узлы-кандидаты без эмбеддингов и извлечения, см. _create_nodes
+            self._source_ctx.collecting = True
+            t0 = time.perf_counter()
+            try:
+                return search(query, depth, parent_node)
+            except Exception as e:
+                logger.error(f"Source {name} failed for '{query[:60]}': {e}")
+                self._source_ctx.error = e
+                return []
+            finally:
+                self._source_ctx.collecting = False
+                self.source_health.record(name, time.perf_counter() - t0, self._source_ctx.error is None)
+    
+    def _execute_multi_source_queries(self, queries: List[str], depth: int, parent_node: Optional[Node] = None) -> List[Node]:
+        """
+        Execute queries across ALL available sources.
+        With CONCURRENT_SOURCES the (query, source) calls run in a thread pool,
+        limited per source by SOURCE_CONCURRENCY; results are still returned in
+        query order, then source order, as in the sequential mode. Sources only
+        return candidate nodes; URLs are claimed and nodes finished (embeddings,
+        extraction) afterwards in that same order, so a URL found by several
+        sources always goes to the earliest one.
+        Calls are started query by query with sources interleaved, so workers
+        spread over different sources' concurrency slots; only sources that are
+        open, slow (p95 >= SOURCE_HEALTH['slow_p95_s']) or slower than the batch
+        budget are moved to the end. With SOURCE_HEALTH['batch_budget_s'] calls
+        not started before the deadline are skipped.
+        """
+        sources = self._search_sources()
+        workers = self.config.SOURCE_WORKERS if self.config.CONCURRENT_SOURCES else 1
+        budget = self.config.SOURCE_HEALTH.get('batch_budget_s')
+        deadline = time.monotonic() + budget if budget else None
+        
+        claimed = [query for query in queries if self._claim_query(query)]
+        # Порядок запуска: запрос за запросом, источники вперемешку; открытые и
+        # медленные источники — в конец очереди, чтобы не занимать воркеры первыми
+        slow_s = self.config.SOURCE_HEALTH.get('slow_p95_s')
+        late = {
+            si for si, (name, _) in enumerate(sources)
+            if self.source_health.is_open(name)
+            or (slow_s is not None and self.source_health.p95(name) >= slow_s)
+            or (budget and self.source_health.p95(name) > budget)
+        }
+        schedule = [(qi, si) for qi in range(len(claimed)) for si in range(len(sources)) if si not in late] + \
+                   [(qi, si) for qi in range(len(claimed)) for si in range(len(sources)) if si in late]
+        
+        def run(task):
+            qi, si = task
+            name, search = sources[si]
+            return self._run_source(name, search, claimed[qi], depth, parent_node, deadline)
+        
+        if workers <= 1:
+            results = {task: run(task) for task in schedule}
+        else:
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="source") as pool:
+                futures = {task: pool.submit(run, task) for task in schedule}
+                results = {task: future.result() for task, future in futures.items()}
         
-        return new_nodes
+        candidates = [node for task in sorted(results) for node in results[task]]
+        new_nodes = [node for node in candidates if self._claim_url(node.source_urls[0])]
+        return self._finish_nodes(new_nodes)
     
     # ================================================================
     # SEARCH IMPLEMENTATIONS - EXPANDED
@@ -619,10 +2737,9 @@ class GraphForecasterV6:
     
     def _search_arxiv(self, query: str, depth: int, parent_node: Optional[Node]) -> List[Node]:
         """Search arXiv"""
-        if self.cache:
-            cached = self.cache.get_search_results(query, "arxiv")
-            if cached:
-                return self._nodes_from_cached_results(cached, "paper", depth, parent_node, query)
+        cached = self._cached_search_results(query, "arxiv")
+        if cached:
+            return self._nodes_from_cached_results(cached, "paper", depth, parent_node, query)
         
         nodes = []
         
@@ -634,32 +2751,26 @@ class GraphForecasterV6:
             )
             
             results = []
+            specs = []
             for result in search.results():
                 url = result.entry_id
                 
-                if url in self.processed_urls:
+                if not self._claim_url(url):
                     continue
                 
-                self.processed_urls.add(url)
-                
                 text = f"Title: {result.title}\n\nAbstract: {result.summary}"
                 
-                node = self._create_node(
-                    text=text,
-                    url=url,
-                    node_type="paper",
-                    depth=depth,
-                    parent_node=parent_node,
-                    query=query,
-                    metadata={
+                specs.append({
+                    'text': text,
+                    'url': url,
+                    'node_type': "paper",
+                    'metadata': {
                         'title': result.title,
                         'authors': [author.name for author in result.authors],
                         'publication_date': result.published.isoformat(),
                         'categories': result.categories
                     }
-                )
-                
-                nodes.append(node)
+                })
                 results.append({
                     'title': result.title,
                     'abstract': result.summary,
@@ -667,20 +2778,22 @@ class GraphForecasterV6:
                     'authors': [author.name for author in result.authors]
                 })
             
+            nodes = self._create_nodes(specs, depth, parent_node, query)
+            
             if self.cache:
                 self.cache.set_search_results(query, "arxiv", results)
         
         except Exception as e:
             logger.error(f"arXiv search error for '{query}': {e}")
+            self._source_error(e)
         
         return nodes
     
     def _search_semantic_scholar(self, query: str, depth: int, parent_node: Optional[Node]) -> List[Node]:
         """Search Semantic Scholar API"""
-        if self.cache:
-            cached = self.cache.get_search_results(query, "semantic_scholar")
-            if cached:
-                return self._nodes_from_cached_results(cached, "paper", depth, parent_node, query)
+        cached = self._cached_search_results(query, "semantic_scholar", pace=False)
+        if cached:
+            return self._nodes_from_cached_results(cached, "paper", depth, parent_node, query)
         
         nodes = []
         
@@ -696,20 +2809,19 @@ class GraphForecasterV6:
                 'fields': 'title,abstract,authors,year,citationCount,url,referenceCount'
             }
             
-            response = requests.get(url, params=params, headers=headers)
+            response = self.http.get(url, params=params, headers=headers)
             
             if response.status_code == 200:
                 data = response.json()
                 results = []
+                specs = []
                 
                 for paper in data.get('data', []):
                     paper_url = paper.get('url', f"https://semanticscholar.org/paper/{paper.get('paperId', '')}")
                     
-                    if paper_url in self.processed_urls:
+                    if not self._claim_url(paper_url):
                         continue
                     
-                    self.processed_urls.add(paper_url)
-                    
                     title = paper.get('title', '')
                     abstract = paper.get('abstract', '')
                     
@@ -720,24 +2832,19 @@ class GraphForecasterV6:
                     
                     authors = [a.get('name', '') for a in paper.get('authors', [])]
                     
-                    node = self._create_node(
-                        text=text,
-                        url=paper_url,
-                        node_type="paper",
-                        depth=depth,
-                        parent_node=parent_node,
-                        query=query,
-                        metadata={
+                    # metadata['citations'] → node.scientific_citations в _create_nodes
+                    specs.append({
+                        'text': text,
+                        'url': paper_url,
+                        'node_type': "paper",
+                        'metadata': {
                             'title': title,
                             'authors': authors,
                             'publication_date': str(paper.get('year', '')),
                             'citations': paper.get('citationCount', 0),
                             'references': paper.get('referenceCount', 0)
                         }
-                    )
-                    
-                    node.scientific_citations = paper.get('citationCount', 0)
-                    nodes.append(node)
+                    })
                     
                     results.append({
                         'title': title,
@@ -746,25 +2853,30 @@ class GraphForecasterV6:
                         'authors': authors
                     })
                 
+                nodes = self._create_nodes(specs, depth, parent_node, query)
+                
                 if self.cache:
                     self.cache.set_search_results(query, "semantic_scholar", results)
+            else:
+                self._source_error(RuntimeError(f"HTTP {response.status_code}"))
         
         except Exception as e:
             logger.error(f"Semantic Scholar search error for '{query}': {e}")
+            self._source_error(e)
         
         return nodes
     
     def _search_crossref(self, query: str, depth: int, parent_node: Optional[Node]) -> List[Node]:
         """Search Crossref API"""
-        if self.cache:
-            cached = self.cache.get_search_results(query, "crossref")
-            if cached:
-                return self._nodes_from_cached_results(cached, "paper", depth, parent_node, query)
+        cached = self._cached_search_results(query, "crossref")
+        if cached:
+            return self._nodes_from_cached_results(cached, "paper", depth, parent_node, query)
         
         nodes = []
         
         try:
             results_data = []
+            specs = []
             works = self.crossref_works.query(query).select('title', 'abstract', 'author', 'published', 'DOI', 'URL')
             
             for i, item in enumerate(works):
@@ -773,11 +2885,9 @@ class GraphForecasterV6:
                 
                 url = item.get('URL', f"https://doi.org/{item.get('DOI', '')}")
                 
-                if url in self.processed_urls:
+                if not self._claim_url(url):
                     continue
                 
-                self.processed_urls.add(url)
-                
                 title = item.get('title', [''])[0] if 'title' in item else ''
                 abstract = item.get('abstract', '')
                 
@@ -796,21 +2906,16 @@ class GraphForecasterV6:
                     if date_parts:
                         pub_date = f"{date_parts[0]}"
                 
-                node = self._create_node(
-                    text=text,
-                    url=url,
-                    node_type="paper",
-                    depth=depth,
-                    parent_node=parent_node,
-                    query=query,
-                    metadata={
+                specs.append({
+                    'text': text,
+                    'url': url,
+                    'node_type': "paper",
+                    'metadata': {
                         'title': title,
                         'authors': authors,
                         'publication_date': pub_date
                     }
-                )
-                
-                nodes.append(node)
+                })
                 results_data.append({
                     'title': title,
                     'abstract': abstract,
@@ -818,20 +2923,22 @@ class GraphForecasterV6:
                     'authors': authors
                 })
             
+            nodes = self._create_nodes(specs, depth, parent_node, query)
+            
             if self.cache:
                 self.cache.set_search_results(query, "crossref", results_data)
         
         except Exception as e:
             logger.error(f"Crossref search error for '{query}': {e}")
+            self._source_error(e)
         
         return nodes
     
     def _search_pubmed(self, query: str, depth: int, parent_node: Optional[Node]) -> List[Node]:
         """Search PubMed via Entrez API"""
-        if self.cache:
-            cached = self.cache.get_search_results(query, "pubmed")
-            if cached:
-                return self._nodes_from_cached_results(cached, "paper", depth, parent_node, query)
+        cached = self._cached_search_results(query, "pubmed")
+        if cached:
+            return self._nodes_from_cached_results(cached, "paper", depth, parent_node, query)
         
         nodes = []
         
@@ -853,6 +2960,7 @@ class GraphForecasterV6:
             handle.close()
             
             results_data = []
+            specs = []
             
             for article in records['PubmedArticle']:
                 medline = article['MedlineCitation']
@@ -861,11 +2969,9 @@ class GraphForecasterV6:
                 pmid = str(medline['PMID'])
                 url = f"https://pubmed.ncbi.nlm.nih.gov/{pmid}/"
                 
-                if url in self.processed_urls:
+                if not self._claim_url(url):
                     continue
                 
-                self.processed_urls.add(url)
-                
                 title = article_data.get('ArticleTitle', '')
                 abstract = article_data.get('Abstract', {}).get('AbstractText', [''])[0] if 'Abstract' in article_data else ''
                 
@@ -878,20 +2984,15 @@ class GraphForecasterV6:
                 if 'AuthorList' in article_data:
                     authors = [f"{a.get('ForeName', '')} {a.get('LastName', '')}".strip() for a in article_data['AuthorList']]
                 
-                node = self._create_node(
-                    text=text,
-                    url=url,
-                    node_type="paper",
-                    depth=depth,
-                    parent_node=parent_node,
-                    query=query,
-                    metadata={
+                specs.append({
+                    'text': text,
+                    'url': url,
+                    'node_type': "paper",
+                    'metadata': {
                         'title': title,
                         'authors': authors
                     }
-                )
-                
-                nodes.append(node)
+                })
                 results_data.append({
                     'title': title,
                     'abstract': abstract,
@@ -899,63 +3000,73 @@ class GraphForecasterV6:
                     'authors': authors
                 })
             
+            nodes = self._create_nodes(specs, depth, parent_node, query)
+            
             if self.cache:
                 self.cache.set_search_results(query, "pubmed", results_data)
         
         except Exception as e:
             logger.error(f"PubMed search error for '{query}': {e}")
+            self._source_error(e)
         
         return nodes
     
     def _search_google_scholar(self, query: str, depth: int, parent_node: Optional[Node]) -> List[Node]:
-        """Google Scholar через scholarly (с fallback на web)"""
-        nodes = []
-        try:
-            search_query = scholarly.search_pubs(query)
-            for i, pub in enumerate(search_query):
-                if i >= self.config.MAX_SCHOLAR_PER_QUERY:
-                    break
-
-                bib = pub.get('bib', {})
-                title = bib.get('title', '')
-                abstract = pub.get('abstract', '') or bib.get('abstract', '')
-                url = pub.get('eprint', pub.get('pub_url', ''))
-
-                if not url or url in self.processed_urls:
-                    continue
-
-                self.processed_urls.add(url)
-
-                text = f"Title: {title}\nAbstract: {abstract}"
-                node = self._create_node(
-                    text=text,
-                    url=url,
-                    node_type="paper",
-                    depth=depth,
-                    parent_node=parent_node,
-                    query=query,
-                    metadata={'title': title}
-                )
-                nodes.append(node)
+        """
+        Google Scholar через scholarly (с fallback на web).
+        Итератор scholarly ограничен SOURCE_TIMEOUTS['google_scholar'];
+        результаты (включая fallback) кэшируются как у остальных источников.
+        """
+        cached = self._cached_search_results(query, "google_scholar")
+        if cached:
+            return self._nodes_from_cached_results(cached, "paper", depth, parent_node, query)
+        
+        results_data = []
+        pubs, error = _take_with_timeout(lambda: scholarly.search_pubs(query),
+                                         self.config.MAX_SCHOLAR_PER_QUERY,
+                                         self.config.SOURCE_TIMEOUTS.get('google_scholar'))
+        for pub in pubs:
+            bib = pub.get('bib', {})
+            url = pub.get('eprint', pub.get('pub_url', ''))
+            if not url or not self._claim_url(url):
+                continue
+            results_data.append({'title': bib.get('title', ''),
+                                 'abstract': pub.get('abstract', '') or bib.get('abstract', ''),
+                                 'url': url})
+
+        if error is not None:
+            logger.warning(f"Google Scholar failed: {error}. Falling back to web search.")
+            # Fallback — общий веб-поиск (WebSearchClient) с site:scholar.google.com;
+            # results_data — то, что scholarly успел отдать до сбоя.
+            # Сбоем источника (SourceHealth) считается только неудачный fallback
+            try:
+                fallback = self.web_search.text(f"{query} site:scholar.google.com", max_results=10)
+            except Exception as e:
+                logger.error(f"Google Scholar fallback error for '{query}': {e}")
+                fallback = []
+            if not fallback:
+                self._source_error(error)
+            for r in fallback:
+                url = r.get('href', '')
+                if url and self._claim_url(url):
+                    results_data.append({'title': r.get('title', ''), 'body': r.get('body', ''), 'url': url})
+
+        specs = [{'text': f"Title: {item['title']}\nAbstract: {item['abstract']}" if 'abstract' in item
+                          else f"Title: {item['title']}\n{item['body']}",
+                  'url': item['url'], 'node_type': "paper", 'metadata': {'title': item['title']}}
+                 for item in results_data]
+        nodes = self._create_nodes(specs, depth, parent_node, query)
 
-        except Exception as e:
-            logger.warning(f"Google Scholar failed: {e}. Falling back to web search.")
-            # Fallback — обычный DDGS с site:scholar.google.com
-            with DDGS() as ddgs:
-                results = ddgs.text(f"{query} site:scholar.google.com", max_results=10)
-                for r in results:
-                    text = f"Title: {r['title']}\n{r['body']}"
-                    node = self._create_node(text, r['href'], "paper", depth, parent_node, query)
-                    nodes.append(node)
+        if self.cache and results_data:
+            self.cache.set_search_results(query, "google_scholar", results_data)
 
         return nodes
     
     def _search_patents(self, query: str, depth: int, parent_node: Optional[Node]) -> List[Node]:
         """Search patents via web scraping"""
-        if self.cache:
-            cached = self.cache.get_search_results(query, "patents")
-            if cached:
-                return self._nodes_from_cached_results(cached, "patent", depth, parent_node, query)
+        cached = self._cached_search_results(query, "patents", pace=False)
+        if cached:
+            return self._nodes_from_cached_results(cached, "patent", depth, parent_node, query)
         
         nodes = []
         
@@ -963,51 +3074,46 @@ class GraphForecasterV6:
         patent_query = f"{query} site:patents.google.com"
         
         try:
-            with DDGS() as ddgs:
-                results = ddgs.text(patent_query, max_results=self.config.MAX_PATENTS_PER_QUERY)
-                results_data = []
+            results = self.web_search.text(patent_query, max_results=self.config.MAX_PATENTS_PER_QUERY)
+            results_data = []
+            specs = []
                 
-                for r in results:
-                    url = r["href"]
-                    
-                    if url in self.processed_urls:
-                        continue
-                    
-                    self.processed_urls.add(url)
+            for r in results:
+                url = r["href"]
                     
-                    text = f"Title: {r['title']}\n\n{r['body']}"
+                if not self._claim_url(url):
+                    continue
                     
-                    node = self._create_node(
-                        text=text,
-                        url=url,
-                        node_type="patent",
-                        depth=depth,
-                        parent_node=parent_node,
-                        query=query,
-                        metadata={'title': r['title']}
-                    )
+                text = f"Title: {r['title']}\n\n{r['body']}"
                     
-                    nodes.append(node)
-                    results_data.append({
-                        'title': r['title'],
-                        'body': r['body'],
-                        'url': url
-                    })
+                specs.append({
+                    'text': text,
+                    'url': url,
+                    'node_type': "patent",
+                    'metadata': {'title': r['title']}
+                })
+                results_data.append({
+                    'title': r['title'],
+                    'body': r['body'],
+                    'url': url
+                })
                 
-                if self.cache:
-                    self.cache.set_search_results(query, "patents", results_data)
+            nodes = self._create_nodes(specs, depth, parent_node, query)
+                
+            if self.cache:
+                self.cache.set_search_results(query, "patents", results_data)
         
         except Exception as e:
             logger.error(f"Patent search error for '{query}': {e}")
+            self._source_error(e)
         
         return nodes
     
     def _search_github(self, query: str, depth: int, parent_node: Optional[Node]) -> List[Node]:
         """Search GitHub repositories"""
-        if self.cache:
-            cached = self.cache.get_search_results(query, "github")
-            if cached:
-                return self._nodes_from_cached_results(cached, "code", depth, parent_node, query)
+        cached = self._cached_search_results(query, "github", pace=False)
+        if cached:
+            return self._nodes_from_cached_results(cached, "code", depth, parent_node, query)
         
         nodes = []
         
@@ -1015,93 +3121,84 @@ class GraphForecasterV6:
         github_query = f"{query} site:github.com"
         
         try:
-            with DDGS() as ddgs:
-                results = ddgs.text(github_query, max_results=self.config.MAX_GITHUB_PER_QUERY)
-                results_data = []
+            results = self.web_search.text(github_query, max_results=self.config.MAX_GITHUB_PER_QUERY)
+            results_data = []
+            specs = []
                 
-                for r in results:
-                    url = r["href"]
-                    
-                    if url in self.processed_urls or '/issues/' in url or '/pull/' in url:
-                        continue
-                    
-                    self.processed_urls.add(url)
+            for r in results:
+                url = r["href"]
                     
-                    text = f"Title: {r['title']}\n\n{r['body']}"
+                if '/issues/' in url or '/pull/' in url or not self._claim_url(url):
+                    continue
                     
-                    node = self._create_node(
-                        text=text,
-                        url=url,
-                        node_type="code",
-                        depth=depth,
-                        parent_node=parent_node,
-                        query=query,
-                        metadata={'title': r['title']}
-                    )
+                text = f"Title: {r['title']}\n\n{r['body']}"
                     
-                    nodes.append(node)
-                    results_data.append({
-                        'title': r['title'],
-                        'body': r['body'],
-                        'url': url
-                    })
+                specs.append({
+                    'text': text,
+                    'url': url,
+                    'node_type': "code",
+                    'metadata': {'title': r['title']}
+                })
+                results_data.append({
+                    'title': r['title'],
+                    'body': r['body'],
+                    'url': url
+                })
                 
-                if self.cache:
-                    self.cache.set_search_results(query, "github", results_data)
+            nodes = self._create_nodes(specs, depth, parent_node, query)
+                
+            if self.cache:
+                self.cache.set_search_results(query, "github", results_data)
         
         except Exception as e:
             logger.error(f"GitHub search error for '{query}': {e}")
+            self._source_error(e)
         
         return nodes
     
     def _search_web(self, query: str, depth: int, parent_node: Optional[Node]) -> List[Node]:
         """Search general web"""
-        if self.cache:
-            cached = self.cache.get_search_results(query, "web")
-            if cached:
-                return self._nodes_from_cached_results(cached, "web", depth, parent_node, query)
+        cached = self._cached_search_results(query, "web", pace=False)
+        if cached:
+            return self._nodes_from_cached_results(cached, "web", depth, parent_node, query)
         
         nodes = []
         
         try:
-            with DDGS() as ddgs:
-                results = ddgs.text(query, max_results=self.config.MAX_WEB_PER_QUERY)
-                results_data = []
+            results = self.web_search.text(query, max_results=self.config.MAX_WEB_PER_QUERY)
+            results_data = []
+            specs = []
                 
-                for r in results:
-                    url = r["href"]
-                    
-                    if url in self.processed_urls:
-                        continue
-                    
-                    self.processed_urls.add(url)
+            for r in results:
+                url = r["href"]
                     
-                    node_type = self._classify_url(url)
+                if not self._claim_url(url):
+                    continue
                     
-                    text = f"Title: {r['title']}\n\n{r['body']}"
+                node_type = self._classify_url(url)
                     
-                    node = self._create_node(
-                        text=text,
-                        url=url,
-                        node_type=node_type,
-                        depth=depth,
-                        parent_node=parent_node,
-                        query=query,
-                        metadata={'title': r['title']}
-                    )
+                text = f"Title: {r['title']}\n\n{r['body']}"
                     
-                    nodes.append(node)
-                    results_data.append({
-                        'title': r['title'],
-                        'body': r['body'],
-                        'url': url
-                    })
+                specs.append({
+                    'text': text,
+                    'url': url,
+                    'node_type': node_type,
+                    'metadata': {'title': r['title']}
+                })
+                results_data.append({
+                    'title': r['title'],
+                    'body': r['body'],
+                    'url': url
+                })
                 
-                if self.cache:
-                    self.cache.set_search_results(query, "web", results_data)
+            nodes = self._create_nodes(specs, depth, parent_node, query)
+                
+            if self.cache:
+                self.cache.set_search_results(query, "web", results_data)
         
         except Exception as e:
             logger.error(f"Web search error for '{query}': {e}")
+            self._source_error(e)
         
         return nodes
     
@@ -1130,16 +3227,14 @@ class GraphForecasterV6:
     
     def _nodes_from_cached_results(self, cached: list, source_type: str, depth: int, parent_node: Optional[Node], query: str) -> List[Node]:
         """Recreate nodes from cached results. Safe against missing 'abstract' / 'body' keys."""
-        nodes = []
+        specs = []
         
         for item in cached:
             url = item.get('url', '')
             
-            if url in self.processed_urls:
+            if not self._claim_url(url):
                 continue
             
-            self.processed_urls.add(url)
-            
             title   = item.get('title', '')
             body    = item.get('abstract', '') or item.get('body', '') or ''
             text    = f"Title: {title}\n\n{body}".strip()
@@ -1149,19 +3244,9 @@ class GraphForecasterV6:
             
             node_type = source_type if source_type != "web" else self._classify_url(url)
             
-            node = self._create_node(
-                text=text,
-                url=url,
-                node_type=node_type,
-                depth=depth,
-                parent_node=parent_node,
-                query=query,
-                metadata=item
-            )
-            
-            nodes.append(node)
+            specs.append({'text': text, 'url': url, 'node_type': node_type, 'metadata': item})
         
-        return nodes
+        return self._create_nodes(specs, depth, parent_node, query)
     
     # ================================================================
     # SOURCE 9: ResearchGate (web scraping + link verification)
@@ -1171,58 +3256,55 @@ class GraphForecasterV6:
                               parent_node: Optional["Node"]) -> List["Node"]:
         """
         Поиск публикаций на ResearchGate через DuckDuckGo (site:researchgate.net).
-        Найденные URL верифицируются HEAD-запросом перед созданием узла.
+        Найденные URL верифицируются (UrlVerifier) перед созданием узла.
         """
-        if self.cache:
-            cached = self.cache.get_search_results(query, "researchgate")
-            if cached:
-                return self._nodes_from_cached_results(cached, "paper", depth, parent_node, query)
+        cached = self._cached_search_results(query, "researchgate", pace=False)
+        if cached:
+            return self._nodes_from_cached_results(cached, "paper", depth, parent_node, query)
 
         nodes = []
         rg_query = f"{query} site:researchgate.net/publication"
 
         try:
-            with DDGS() as ddgs:
-                results = ddgs.text(rg_query, max_results=self.config.MAX_RESEARCHGATE_PER_QUERY)
+            results = self.web_search.text(rg_query, max_results=self.config.MAX_RESEARCHGATE_PER_QUERY)
             results_data = []
+            specs = []
 
-            for r in results:
-                url = r["href"]
+            candidates = [r for r in results if r["href"] not in self.processed_urls]
+            # Верификация ссылок одним конкурентным батчем: страницы реально существуют?
+            alive = self.url_verifier.verify_many([r["href"] for r in candidates])
 
-                if url in self.processed_urls:
-                    continue
+            for r in candidates:
+                url = r["href"]
 
-                # Верификация ссылки: проверяем, что страница реально существует
-                if not self._verify_url(url):
+                if not alive[url]:
                     logger.debug(f"ResearchGate URL не прошёл верификацию: {url}")
                     continue
 
-                self.processed_urls.add(url)
+                if not self._claim_url(url):
+                    continue
                 text = f"Title: {r['title']}\n\n{r['body']}"
-                node = self._create_node(text, url, "paper", depth, parent_node, query,
-                                         metadata={"title": r["title"]})
-                nodes.append(node)
+                specs.append({"text": text, "url": url, "node_type": "paper",
+                              "metadata": {"title": r["title"]}})
                 results_data.append({"title": r["title"], "body": r["body"], "url": url})
 
+            nodes = self._create_nodes(specs, depth, parent_node, query)
+
             if self.cache and results_data:
                 self.cache.set_search_results(query, "researchgate", results_data)
 
         except Exception as e:
             logger.error(f"ResearchGate search error for '{query}': {e}")
+            self._source_error(e)
 
         return nodes
 
-    def _verify_url(self, url: str, timeout: int = 5) -> bool:
+    def _verify_url(self, url: str) -> bool:
         """
-        Проверяет доступность URL через HEAD-запрос.
-        Возвращает True, если статус 200-399.
+        Проверяет доступность URL (UrlVerifier: HEAD, кэш результата).
+        Возвращает True, если статус 200-399. Для пачки ссылок — url_verifier.verify_many.
         """
-        try:
-            resp = requests.head(url, timeout=timeout, allow_redirects=True,
-                                 headers={"User-Agent": "Mozilla/5.0"})
-            return resp.status_code < 400
-        except Exception:
-            return False
+        return self.url_verifier.verify(url)
 
     # ================================================================
     # SOURCE 10: Форумы — Reddit, HackerNews, StackExchange
@@ -1235,12 +3317,10 @@ class GraphForecasterV6:
         Если задан REDDIT_CLIENT_ID — использует Reddit API напрямую.
         Заполняет forum_post_count и forum_sentiment_raw узла.
         """
-        if self.cache:
-            cached = self.cache.get_search_results(query, "forums")
-            if cached:
-                return self._nodes_from_cached_results(cached, "forum", depth, parent_node, query)
+        cached = self._cached_search_results(query, "forums", pace=False)
+        if cached:
+            return self._nodes_from_cached_results(cached, "forum", depth, parent_node, query)
 
-        nodes      = []
         forum_sites = [
             "site:reddit.com",
             "site:news.ycombinator.com",
@@ -1249,30 +3329,37 @@ class GraphForecasterV6:
             "site:researchgate.net/post",
         ]
         results_data = []
+        specs = []
 
-        for site_filter in forum_sites:
-            forum_query = f"{query} {site_filter}"
-            try:
-                with DDGS() as ddgs:
-                    results = ddgs.text(forum_query,
-                                        max_results=self.config.MAX_FORUM_PER_QUERY // len(forum_sites) + 1)
-                for r in results:
-                    url = r["href"]
-                    if url in self.processed_urls:
-                        continue
-                    self.processed_urls.add(url)
-                    text = f"Title: {r['title']}\n\n{r['body']}"
-                    node = self._create_node(text, url, "forum", depth, parent_node, query,
-                                             metadata={"title": r["title"]})
-                    # Подсчёт постов и сырой sentiment
-                    node.forum_post_count += 1
-                    nodes.append(node)
-                    results_data.append({"title": r["title"], "body": r["body"], "url": url})
-            except Exception as e:
-                logger.warning(f"Forum search ({site_filter}) error for '{query}': {e}")
+        # Все site-фильтры одним вызовом: параллельно или одним OR-запросом.
+        # Если не ответил ни один сайт — это сбой источника (SourceHealth), но Reddit API ниже всё равно опрашиваем
+        try:
+            results = self.web_search.text_sites(
+                query, forum_sites,
+                max_results_per_site=self.config.MAX_FORUM_PER_QUERY // len(forum_sites) + 1,
+                combine=self.config.WEB_SEARCH.get('combine_site_queries', False),
+            )
+        except Exception as e:
+            logger.error(f"Forum search failed for '{query[:60]}': {e}")
+            self._source_error(e)
+            results = []
+        for r in results:
+            url = r["href"]
+            if not self._claim_url(url):
+                continue
+            text = f"Title: {r['title']}\n\n{r['body']}"
+            specs.append({"text": text, "url": url, "node_type": "forum",
+                          "metadata": {"title": r["title"]}})
+            results_data.append({"title": r["title"], "body": r["body"], "url": url})
+
+        # Эмбеддинги всех сайтов считаются одним батчем
+        nodes = self._create_nodes(specs, depth, parent_node, query)
+        for node in nodes:
+            # Подсчёт постов и сырой sentiment
+            node.forum_post_count += 1
 
         # Опциональный прямой доступ к Reddit API
-        if self.config.REDDIT_CLIENT_ID and self.config.REDDIT_CLIENT_SECRET:
+        if self.reddit_auth:
             reddit_nodes = self._search_reddit_api(query, depth, parent_node)
             nodes.extend(reddit_nodes)
 
@@ -1286,41 +3373,55 @@ class GraphForecasterV6:
         """
         Поиск через Reddit API (PRAW-совместимый OAuth).
         Активируется только при наличии REDDIT_CLIENT_ID и REDDIT_CLIENT_SECRET.
+        Токен общий (self.reddit_auth); до MAX_REDDIT_API_PER_QUERY постов
+        постранично по курсору `after`.
         """
         nodes = []
         try:
-            token_resp = requests.post(
-                "https://www.reddit.com/api/v1/access_token",
-                auth=(self.config.REDDIT_CLIENT_ID, self.config.REDDIT_CLIENT_SECRET),
-                data={"grant_type": "client_credentials"},
-                headers={"User-Agent": "GraphForecasterV6/1.0"},
-                timeout=10,
-            )
-            token = token_resp.json().get("access_token", "")
-            if not token:
-                return nodes
+            posts = []
+            after = None
+            retried_auth = False
+            while len(posts) < self.config.MAX_REDDIT_API_PER_QUERY:
+                params = {"q": query, "sort": "relevance", "type": "link",
+                          "limit": min(100, self.config.MAX_REDDIT_API_PER_QUERY - len(posts))}
+                if after:
+                    params["after"] = after
+                search_resp = self.http.get(
+                    "https://oauth.reddit.com/search",
+                    params=params,
+                    headers={"Authorization": f"Bearer {self.reddit_auth.token()}"},
+                    timeout=10,
+                )
+                if search_resp.status_code == 401 and not retried_auth:
+                    # токен отозван раньше expires_in — берём новый один раз
+                    self.reddit_auth.invalidate()
+                    retried_auth = True
+                    continue
+                search_resp.raise_for_status()
+                listing = search_resp.json().get("data", {})
+                children = listing.get("children", [])
+                posts.extend(children)
+                after = listing.get("after")
+                if not after or not children:
+                    break
 
-            headers = {"Authorization": f"Bearer {token}", "User-Agent": "GraphForecasterV6/1.0"}
-            search_resp = requests.get(
-                "https://oauth.reddit.com/search",
-                params={"q": query, "limit": 25, "sort": "relevance", "type": "link"},
-                headers=headers,
-                timeout=10,
-            )
-            for post in search_resp.json().get("data", {}).get("children", []):
+            specs, comments = [], []
+            for post in posts:
                 d   = post["data"]
                 url = f"https://reddit.com{d.get('permalink', '')}"
-                if url in self.processed_urls:
+                if not self._claim_url(url):
                     continue
-                self.processed_urls.add(url)
                 text = f"Title: {d.get('title','')}\n\n{d.get('selftext','')}"
-                node = self._create_node(text, url, "forum", depth, parent_node, query,
-                                         metadata={"title": d.get("title",""),
-                                                   "upvotes": d.get("score", 0)})
-                node.forum_post_count = d.get("num_comments", 0)
-                nodes.append(node)
+                specs.append({"text": text, "url": url, "node_type": "forum",
+                              "metadata": {"title": d.get("title",""),
+                                           "upvotes": d.get("score", 0)}})
+                comments.append(d.get("num_comments", 0))
+            nodes = self._create_nodes(specs, depth, parent_node, query)
+            for node, num_comments in zip(nodes, comments):
+                node.forum_post_count = num_comments
         except Exception as e:
             logger.warning(f"Reddit API error for '{query}': {e}")
+            self._source_error(e)
         return nodes
 
     # ================================================================
@@ -1424,10 +3525,9 @@ class GraphForecasterV6:
         Fallback: поиск инвестиционных новостей через DuckDuckGo.
         Ищет в Crunchbase News, TechCrunch, VentureBeat.
         """
-        if self.cache:
-            cached = self.cache.get_search_results(query, "investment_web")
-            if cached:
-                return self._nodes_from_cached_results(cached, "startup", depth, parent_node, query)
+        cached = self._cached_search_results(query, "investment_web", pace=False)
+        if cached:
+            return self._nodes_from_cached_results(cached, "startup", depth, parent_node, query)
 
         nodes = []
         invest_query = (
@@ -1436,23 +3536,23 @@ class GraphForecasterV6:
         )
         results_data = []
         try:
-            with DDGS() as ddgs:
-                results = ddgs.text(invest_query, max_results=self.config.MAX_INVESTMENT_PER_QUERY)
+            results = self.web_search.text(invest_query, max_results=self.config.MAX_INVESTMENT_PER_QUERY)
+            specs = []
             for r in results:
                 url = r["href"]
-                if url in self.processed_urls:
+                if not self._claim_url(url):
                     continue
-                self.processed_urls.add(url)
                 text = f"Title: {r['title']}\n\n{r['body']}"
-                node = self._create_node(text, url, "startup", depth, parent_node, query,
-                                         metadata={"title": r["title"]})
-                nodes.append(node)
+                specs.append({"text": text, "url": url, "node_type": "startup",
+                              "metadata": {"title": r["title"]}})
                 results_data.append({"title": r["title"], "body": r["body"], "url": url})
+            nodes = self._create_nodes(specs, depth, parent_node, query)
 
             if self.cache and results_data:
                 self.cache.set_search_results(query, "investment_web", results_data)
         except Exception as e:
             logger.error(f"Investment web search error for '{query}': {e}")
+            self._source_error(e)
         return nodes
 
     # ================================================================
@@ -1464,14 +3564,13 @@ class GraphForecasterV6:
         """
         Запрашивает LLM о ключевых работах и технологиях по теме из «памяти»
         (знаний, встроенных в модель при обучении).
-        Каждая возвращённая ссылка проходит верификацию (_verify_url).
+        Каждая возвращённая ссылка проходит верификацию (url_verifier.verify_many).
         Непроверяемые ссылки (нет HTTP-доступа) сохраняются как узлы с пометкой
         'unverified_memory_reference', но не удаляются — они могут быть ценными.
         """
-        if self.cache:
-            cached = self.cache.get_search_results(query, "model_memory")
-            if cached:
-                return self._nodes_from_cached_results(cached, "paper", depth, parent_node, query)
+        cached = self._cached_search_results(query, "model_memory", pace=False)
+        if cached:
+            return self._nodes_from_cached_results(cached, "paper", depth, parent_node, query)
 
         prompt = f"""
         From your training knowledge, list up to 10 key papers, technologies,
@@ -1499,8 +3598,8 @@ class GraphForecasterV6:
         """
 
         response = self._call_llm(prompt, temperature=0.1, response_format="json")
-        nodes = []
         results_data = []
+        specs = []
 
         try:
             items = json.loads(response)
@@ -1509,6 +3608,11 @@ class GraphForecasterV6:
         except Exception:
             items = []
 
+        # Все ссылки проверяются одним конкурентным батчем
+        alive = self.url_verifier.verify_many(
+            [str(item.get("url", "")).strip() for item in items
+             if isinstance(item, dict) and str(item.get("url", "")).strip()])
+
         for item in items:
             title       = item.get("title", "").strip()
             description = item.get("description", "").strip()
@@ -1524,38 +3628,27 @@ class GraphForecasterV6:
             # Верификация ссылки
             verified = False
             if url:
-                verified = self._verify_url(url)
+                verified = alive.get(url, False)
                 if not verified:
                     logger.debug(f"Memory reference URL не верифицирован: {url}")
                     # Не выбрасываем — оставляем с пометкой
                     url = url  # сохраняем для трассировки
 
-            if url in self.processed_urls:
+            if url and not self._claim_url(url):
                 continue
-            if url:
-                self.processed_urls.add(url)
 
-            node = self._create_node(
-                text=text,
-                url=url or f"memory://{hashlib.md5(title.encode()).hexdigest()[:12]}",
-                node_type="paper",
-                depth=depth,
-                parent_node=parent_node,
-                query=query,
-                metadata={
+            specs.append({
+                "text": text,
+                "url": url or f"memory://{hashlib.md5(title.encode()).hexdigest()[:12]}",
+                "node_type": "paper",
+                "metadata": {
                     "title": title,
                     "authors": authors,
                     "publication_date": year,
                     "memory_verified": verified,
                     "source": "model_memory",
                 }
-            )
-
-            if not verified:
-                # Добавляем в description пометку об непроверенности
-                node.description = f"[UNVERIFIED MEMORY REF] {node.description}"
-
-            nodes.append(node)
+            })
             results_data.append({
                 "title": title,
                 "body": description,
@@ -1563,11 +3656,17 @@ class GraphForecasterV6:
                 "verified": verified,
             })
 
+        nodes = self._create_nodes(specs, depth, parent_node, query)
+        for node, spec in zip(nodes, specs):
+            if not spec["metadata"]["memory_verified"]:
+                # Добавляем в description пометку об непроверенности (сохраняется при обогащении)
+                node.description = f"{self.UNVERIFIED_MEMORY_MARKER}{node.peek('description')}"
+
         if self.cache and results_data:
             self.cache.set_search_results(query, "model_memory", results_data)
 
         logger.info(f"Model memory: {len(nodes)} references found for '{query[:60]}' "
-                    f"({sum(1 for n in nodes if 'UNVERIFIED' not in n.description)} verified)")
+                    f"({sum(1 for spec in specs if spec['metadata']['memory_verified'])} verified)")
         return nodes
 
     # ================================================================
@@ -1666,7 +3765,7 @@ class GraphForecasterV6:
         logger.info(f"Scoring social perception for {len(target_nodes)} nodes...")
 
         for node in tqdm(target_nodes, desc="Social perception"):
-            text = node.full_text[:1500] if node.full_text else node.description
+            text = node.full_text[:1500] if node.full_text else node.peek('description')
 
             # 1. Review sentiment
             review_score   = self._score_review_sentiment(text)
@@ -1709,22 +3808,88 @@ class GraphForecasterV6:
         
         logger.info(f"Extracting domains from {len(unprocessed)} nodes")
         
-        # Process in batches
+        # Process in batches, in rounds: all batches of a round go to the LLM executor
+        # at once; documents missing from a response (unparseable or truncated) are
+        # retried in the next round — a batch that yielded nothing is bisected.
+        # A failed call (provider error after LLMExecutor's retries) is not retried
+        # here: its nodes stay unextracted for the final pass of ingest_all_sources
         batch_size = self.config.CROSS_DOMAIN_BATCH_SIZE
+        batches = [unprocessed[i:i + batch_size] for i in range(0, len(unprocessed), batch_size)]
         
-        for i in range(0, len(unprocessed), batch_size):
-            batch = unprocessed[i:i + batch_size]
-            
-            # Prepare batch text
-            batch_texts = []
-            for idx, node in enumerate(batch):
-                text_sample = node.full_text[:2000] if node.full_text else node.description
-                batch_texts.append(f"[Document {idx}]\n{text_sample}\n")
+        while batches:
+            futures = [
+                self.llm.submit(self._call_llm, self._domain_extraction_prompt(batch), temperature=0.1,
+                                max_tokens=4000, raise_errors=True)
+                for batch in batches
+            ]
             
-            combined_text = "\n".join(batch_texts)
+            retry = []
+            for batch, future in zip(batches, futures):
+                try:
+                    response = future.result()
+                except Exception as e:
+                    logger.error(f"Domain extraction call failed for {len(batch)} nodes: {e}")
+                    continue
+                done = set()
+                for extraction in _parse_json_items(response):
+                    if not isinstance(extraction, dict):
+                        continue
+                    try:
+                        doc_id = int(extraction.get('doc_id', 0))
+                    except (TypeError, ValueError):
+                        continue
+                    if not 0 <= doc_id < len(batch) or doc_id in done:
+                        continue
+                    done.add(doc_id)
+                    self._apply_domain_extraction(batch[doc_id], extraction)
+                
+                missing = [node for idx, node in enumerate(batch) if idx not in done]
+                if not missing:
+                    continue
+                if len(batch) == 1:
+                    # Single document still failing: give up on it to avoid retry loops
+                    logger.error(f"Domain extraction failed for node {batch[0].id}")
+                    batch[0].domains_extracted = True
+                elif done:
+                    retry.append(missing)
+                else:
+                    half = len(missing) // 2
+                    retry.extend([missing[:half], missing[half:]])
             
-            # LLM extraction
-            prompt = f"""
+            if retry:
+                logger.info(f"Domain extraction: retrying {sum(len(b) for b in retry)} documents "
+                            f"in {len(retry)} batches")
+            batches = retry
+        
+        logger.info(f"Total discovered domains: {len(self.discovered_domains)}")
+    
+    def _apply_domain_extraction(self, node: Node, extraction: dict):
+        """Store one document's domain extraction on its node and in discovered_domains."""
+        domains = extraction.get('mentioned_domains') or []
+        technologies = extraction.get('cited_technologies') or []
+        fields = extraction.get('related_fields') or []
+        
+        node.mentioned_domains = domains
+        node.cited_works = technologies
+        node.peek('key_concepts').extend(fields)   # без запуска ленивого обогащения
+        
+        # Add to global domain tracking
+        self.discovered_domains.update(domains)
+        self.discovered_domains.update(fields)
+        
+        node.domains_extracted = True
+    
+    def _domain_extraction_prompt(self, batch: List[Node]) -> str:
+        """Domain extraction prompt for one batch; documents are numbered by position in the batch."""
+        # Prepare batch text
+        batch_texts = []
+        for idx, node in enumerate(batch):
+            text_sample = node.full_text[:2000] if node.full_text else node.description
+            batch_texts.append(f"[Document {idx}]\n{text_sample}\n")
+        
+        combined_text = "\n".join(batch_texts)
+        
+        return f"""
             Analyze these {len(batch)} technical documents and extract:
             
             1. **Technical domains** mentioned (e.g., "laser physics", "semiconductor manufacturing", "biomedical imaging")
@@ -1746,43 +3911,6 @@ class GraphForecasterV6:
             
             Be specific and technical. Extract ALL domains mentioned, even briefly.
             """
-            
-            response = self._call_llm(prompt, temperature=0.1, max_tokens=4000)
-            
-            try:
-                extractions = json.loads(response)
-                
-                for extraction in extractions:
-                    doc_id = extraction.get('doc_id', 0)
-                    if doc_id >= len(batch):
-                        continue
-                    
-                    node = batch[doc_id]
-                    
-                    # Update node
-                    domains = extraction.get('mentioned_domains', [])
-                    technologies = extraction.get('cited_technologies', [])
-                    fields = extraction.get('related_fields', [])
-                    
-                    node.mentioned_domains = domains
-                    node.cited_works = technologies
-                    node.key_concepts.extend(fields)
-                    
-                    # Add to global domain tracking
-                    self.discovered_domains.update(domains)
-                    self.discovered_domains.update(fields)
-                    
-                    node.domains_extracted = True
-            
-            except Exception as e:
-                logger.error(f"Domain extraction error: {e}")
-                # Mark as processed anyway to avoid retry loops
-                for node in batch:
-                    node.domains_extracted = True
-            
-            self.rate_limiter.wait_if_needed()
-        
-        logger.info(f"Total discovered domains: {len(self.discovered_domains)}")
     
     def discover_cross_domain_analogies(self, max_analogies_per_domain: int = 10):
         """
@@ -1831,6 +3959,9 @@ class GraphForecasterV6:
                     node.solves_limitations.append(lim)
             
             logger.info(f"Found {len(analogy_nodes)} cross-domain analogies")
+        
+        # Связываем только новые analogy-узлы с уже построенным графом
+        self._auto_connect_nodes()
     
     def _generate_domain_specific_queries(self, category: str, limitations: List[str], discovered_domains: List[str]) -> List[str]:
         """
@@ -1930,54 +4061,125 @@ class GraphForecasterV6:
     
     def _create_node(self, text: str, url: str, node_type: str, depth: int, parent_node: Optional[Node], query: str, metadata: dict = None) -> Node:
         """Create node with extraction"""
-        metadata = metadata or {}
-        
-        embedding = self._get_embedding(text)
-        extraction = self._extract_node_data(text, node_type)
-        
-        node_id = str(uuid.uuid4())
-        
-        node = Node(
-            id=node_id,
-            node_type=node_type,
-            timestamp=datetime.utcnow().timestamp(),
-            embedding=embedding,
-            description=extraction.get('description', text[:200]),
-            full_text=text,
-            title=metadata.get('title', extraction.get('title', '')),
-            advantages=extraction.get('advantages', []),
-            limitations=extraction.get('limitations', []),
-            key_concepts=extraction.get('key_concepts', []),
-            source_urls=[url],
-            authors=metadata.get('authors', []),
-            publication_date=metadata.get('publication_date'),
-            discovery_depth=depth,
-            discovery_query=query,
-            discovery_path=[parent_node.id] if parent_node else [],
-            dual_use_risk=float(extraction.get('dual_use_risk', 0.0)),
-            strategic_value=float(extraction.get('strategic_value', 0.0)),
-            legal_risk_score=float(extraction.get('legal_risk_score', 0.0)),
-            export_control_risk=float(extraction.get('export_control_risk', 0.0)),
-        )
+        spec = {'text': text, 'url': url, 'node_type': node_type, 'metadata': metadata}
+        return self._create_nodes([spec], depth, parent_node, query)[0]
+    
+    def _create_nodes(self, specs: List[dict], depth: int, parent_node: Optional[Node], query: str) -> List[Node]:
+        """
+        Create nodes for one batch of search results.
+        spec: {'text', 'url', 'node_type', 'metadata' (optional)}.
+        Inside a source call of _execute_multi_source_queries the nodes are only
+        candidates: _finish_nodes runs there once URLs are claimed in source order.
+        """
+        nodes = []
+        for spec in specs:
+            text = spec['text']
+            metadata = spec.get('metadata') or {}
+            node = Node(
+                id=str(uuid.uuid4()),
+                node_type=spec['node_type'],
+                timestamp=datetime.utcnow().timestamp(),
+                embedding=None,
+                description=text[:200],
+                full_text=text,
+                title=metadata.get('title', ''),
+                source_urls=[spec['url']],
+                authors=metadata.get('authors', []),
+                publication_date=metadata.get('publication_date'),
+                discovery_depth=depth,
+                discovery_query=query,
+                discovery_path=[parent_node.id] if parent_node else [],
+            )
+            
+            # Set citations from metadata
+            if 'citations' in metadata:
+                node.scientific_citations = metadata['citations']
+            nodes.append(node)
+        
+        if getattr(self._source_ctx, 'collecting', False):
+            return nodes
+        return self._finish_nodes(nodes)
+    
+    def _finish_nodes(self, nodes: List[Node]) -> List[Node]:
+        """
+        Embed, extract and register created nodes.
+        Embeddings for the whole batch are looked up / computed in one call.
+        """
+        if not nodes:
+            return []
+        
+        embeddings = self._get_embeddings([node.full_text for node in nodes])
+        
+        # Сразу извлекаем только релевантные цели узлы, остальные — лениво
+        lazy = self.config.LAZY_ENRICHMENT
+        similarities = self._target_similarities(embeddings)
+        eager = [i for i, similarity in enumerate(similarities)
+                 if not lazy.get('enabled') or similarity >= lazy['min_similarity']]
+        extractions = dict(zip(eager, self._extract_nodes_data(
+            [(nodes[i].full_text, nodes[i].node_type) for i in eager])))
+        
+        for i, (node, embedding) in enumerate(zip(nodes, embeddings)):
+            node.embedding = embedding
+            extraction = extractions.get(i)
+            if extraction is not None:
+                self._apply_extraction(node, extraction)
+            else:
+                node.enrichment_pending = True
+                node.enrich = self._enrich_node
+            
+            with self._state_lock:
+                self.nodes[node.id] = node
         
-        # Set citations from metadata
-        if 'citations' in metadata:
-            node.scientific_citations = metadata['citations']
+        self._update_convergence_potentials(nodes)
         
-        self.nodes[node_id] = node
-        self._update_convergence_potential(node)
+        with self._state_lock:
+            self.extraction_stats['deferred'] += len(nodes) - len(eager)
         
-        return node
+        return nodes
     
-    def _extract_node_data(self, text: str, node_type: str) -> dict:
-        """LLM extraction"""
-        prompt = f"""
-        Extract from this {node_type}:
+    def _apply_extraction(self, node: Node, extraction: dict):
+        """Copy LLM extraction fields onto the node (title only if metadata gave none)."""
+        marker = self.UNVERIFIED_MEMORY_MARKER if node.peek('description').startswith(self.UNVERIFIED_MEMORY_MARKER) else ""
+        node.description = marker + extraction.get('description', node.full_text[:200])
+        if not node.title:
+            node.title = extraction.get('title', '')
+        node.advantages = extraction.get('advantages', [])
+        node.limitations = extraction.get('limitations', [])
+        # Поля, добавленные _extract_domains_from_nodes до обогащения, сохраняем
+        node.key_concepts = list(extraction.get('key_concepts', [])) + node.peek('key_concepts')
+        node.dual_use_risk = float(extraction.get('dual_use_risk', 0.0))
+        node.strategic_value = float(extraction.get('strategic_value', 0.0))
+        node.legal_risk_score = float(extraction.get('legal_risk_score', 0.0))
+        node.export_control_risk = float(extraction.get('export_control_risk', 0.0))
+    
+    def _enrich_nodes(self, nodes: List[Node]) -> int:
+        """Run the deferred LLM extraction for the pending nodes among `nodes` in one batched pass."""
+        pending = [n for n in nodes if n.enrichment_pending]
+        if not pending:
+            return 0
         
-        {text[:12000]}
+        extractions = self._extract_nodes_data([(n.full_text, n.node_type) for n in pending])
         
-        Return JSON:
-        {{
+        with self._state_lock:
+            enriched = []
+            for node, extraction in zip(pending, extractions):
+                if not node.enrichment_pending:      # обогащён параллельно другим потоком
+                    continue
+                self._apply_extraction(node, extraction)
+                node.enrichment_pending = False
+                node.enrich = None
+                enriched.append(node)
+            self.extraction_stats['enriched_later'] += len(enriched)
+        
+        self._update_convergence_potentials(enriched)
+        return len(enriched)
+    
+    def _enrich_node(self, node: Node):
+        """Node.enrich hook: an enriched field of a pending node was read."""
+        self._enrich_nodes([node])
+    
+    # Схема полей узла — общая для одиночного и пакетного извлечения
+    _EXTRACTION_SCHEMA = """{{
           "title": "concise title",
           "description": "2-3 sentence summary",
           "advantages": ["advantage1", "advantage2", ...],
@@ -1987,58 +4189,347 @@ class GraphForecasterV6:
           "dual_use_risk": <float 0-10, dual-use / военный потенциал>,
           "strategic_value": <float 0-10, стратегическая ценность>,
           "legal_risk_score": <float 0-10, правовые/регуляторные риски>,
-          "export_control_risk": <float 0-10, риск экспортного контроля>
-        }}
-        """
+          "export_control_risk": <float 0-10, риск экспортного контроля>{doc_id}
+        }}"""
+    
+    def _extraction_prompt(self, text: str, node_type: str) -> str:
+        """Single-document extraction prompt; also the per-document cache key for batches."""
+        return f"""
+        Extract from this {node_type}:
+        
+        {text[:12000]}
         
-        response = self._call_llm(prompt, temperature=0.0, response_format="json")
+        Return JSON:
+        {self._EXTRACTION_SCHEMA.format(doc_id="")}
+        """
+    
+    @staticmethod
+    def _default_extraction(text: str) -> dict:
+        return {
+            'description': text[:200],
+            'advantages': [],
+            'limitations': [],
+            'key_concepts': []
+        }
+    
+    def _extract_node_data(self, text: str, node_type: str) -> dict:
+        """LLM extraction"""
+        response = self._call_llm(self._extraction_prompt(text, node_type), temperature=0.0, response_format="json")
         
         try:
             return json.loads(response)
         except:
-            return {
-                'description': text[:200],
-                'advantages': [],
-                'limitations': [],
-                'key_concepts': []
-            }
+            return self._default_extraction(text)
+    
+    def _extract_nodes_data(self, docs: List[Tuple[str, str]]) -> List[dict]:
+        """
+        LLM extraction for several (text, node_type) documents at once.
+        
+        Each document is first looked up under its single-document prompt, so
+        results are shared with _extract_node_data. Misses are packed into
+        requests of up to NODE_EXTRACTION_BATCH['max_docs'] documents / 'max_chars'
+        characters; results are mapped back by doc_id and cached per document,
+        so a batch that fails half-way is not paid for again. Documents the
+        model skipped fall back to the single-document call. All requests run
+        concurrently on the LLMExecutor. Every path, single documents and
+        disabled batching included, is counted in extraction_stats.
+        
+        Before packing, each miss claims its single-document prompt in
+        _extraction_flights: the same document (e.g. one paper found by arXiv
+        and Crossref) already being extracted by another call, or repeated in
+        `docs`, waits for that result instead of being sent again.
+        """
+        if not docs:
+            return []
+        model = self.config.LLM_MODEL
+        prompts = [self._extraction_prompt(text, node_type) for text, node_type in docs]
+        results: List[Optional[dict]] = [None] * len(docs)
+        
+        pending = []
+        owned: Dict[str, Tuple[int, Future]] = {}      # промпт → (индекс-лидер, future для ждущих)
+        repeats: Dict[int, int] = {}                    # повтор внутри docs → индекс-лидер
+        shared: Dict[int, Future] = {}                  # документ в полёте у другого вызова
+        for i, prompt in enumerate(prompts):
+            cached = self.cache.get_llm_response(prompt, model) if self.cache else None
+            if cached:
+                try:
+                    results[i] = json.loads(cached)
+                    continue
+                except ValueError:
+                    pass
+            if prompt in owned:
+                repeats[i] = owned[prompt][0]
+                continue
+            future, leader = self._extraction_flights.claim(prompt)
+            if not leader:
+                shared[i] = future
+                continue
+            owned[prompt] = (i, future)
+            pending.append(i)
+        
+        try:
+            self._extract_pending(docs, prompts, pending, results, len(repeats) + len(shared))
+        except BaseException as e:
+            for i, future in owned.values():
+                if not future.done():
+                    future.set_exception(e)
+            raise
+        finally:
+            # Сначала отдаём свои результаты, потом ждём чужие — без взаимных ожиданий
+            for prompt, (i, future) in owned.items():
+                if not future.done():
+                    future.set_result(results[i])
+                self._extraction_flights.release(prompt)
+        
+        for i, leader in repeats.items():
+            results[i] = results[leader]
+        for i, future in shared.items():
+            results[i] = future.result()
+        
+        return results
+    
+    def _extract_pending(self, docs: List[Tuple[str, str]], prompts: List[str], pending: List[int],
+                         results: List[Optional[dict]], shared: int):
+        """Pack and run the claimed misses of _extract_nodes_data, filling `results` in place."""
+        settings = self.config.NODE_EXTRACTION_BATCH
+        max_docs = settings['max_docs'] if settings.get('enabled', True) else 1
+        model = self.config.LLM_MODEL
+        
+        # Упаковка промахов: не больше max_docs документов и max_chars текста на запрос
+        batches, current, current_chars = [], [], 0
+        for i in pending:
+            size = len(docs[i][0][:12000])
+            if current and (len(current) >= max_docs or current_chars + size > settings['max_chars']):
+                batches.append(current)
+                current, current_chars = [], 0
+            current.append(i)
+            current_chars += size
+        if current:
+            batches.append(current)
+        
+        stats = defaultdict(int, docs=len(docs), shared=shared,
+                            cached=len(docs) - len(pending) - shared)
+        
+        # Все запросы уходят в LLMExecutor сразу; пакет из одного документа —
+        # обычный одиночный запрос
+        singles: Dict[int, Future] = {}
+        batch_futures = []
+        for batch in batches:
+            stats['llm_calls'] += 1
+            stats['single_prompt_chars'] += sum(len(prompts[i]) for i in batch)
+            if len(batch) == 1:
+                i = batch[0]
+                if len(batches) == 1:
+                    # Единственный запрос — в текущем потоке, без LLM-пула:
+                    # ленивое обогащение (_enrich_node) может прийти из потока самого пула
+                    results[i] = self._extract_node_data(*docs[i])
+                else:
+                    singles[i] = self.llm.submit(self._extract_node_data, *docs[i])
+                stats['sent_prompt_chars'] += len(prompts[i])
+            else:
+                batch_futures.append((batch, self.llm.submit(self._extract_batch, batch, docs)))
+                stats['batched_docs'] += len(batch)
+        
+        for batch, future in batch_futures:
+            parsed = future.result()
+            stats['sent_prompt_chars'] += parsed.pop('_prompt_chars')
+            
+            for i in batch:
+                extraction = parsed.get(i)
+                if extraction is None:
+                    # Модель пропустила документ — добираем одиночным запросом
+                    singles[i] = self.llm.submit(self._extract_node_data, *docs[i])
+                    stats['llm_calls'] += 1
+                    stats['fallback_calls'] += 1
+                    stats['sent_prompt_chars'] += len(prompts[i])
+                    continue
+                results[i] = extraction
+                if self.cache:
+                    self.cache.set_llm_response(prompts[i], model, json.dumps(extraction, ensure_ascii=False))
+        
+        for i, future in singles.items():
+            results[i] = future.result()
+        
+        with self._state_lock:
+            for key, value in stats.items():
+                self.extraction_stats[key] += value
+    
+    def _extract_batch(self, batch: List[int], docs: List[Tuple[str, str]]) -> Dict:
+        """One multi-document extraction request; returns {doc index: extraction, '_prompt_chars': n}."""
+        blocks = "\n\n".join(
+            f"[Document {i}] ({docs[i][1]})\n{docs[i][0][:12000]}" for i in batch
+        )
+        schema = self._EXTRACTION_SCHEMA.format(
+            doc_id=',\n          "doc_id": <document number from its header>')
+        prompt = f"""
+        Extract from each of these {len(batch)} documents (document type in the header):
+        
+        {blocks}
+        
+        Return JSON:
+        {{
+          "documents": [
+            {schema},
+            ...
+          ]
+        }}
+        One entry per document.
+        """
+        
+        max_tokens = min(16000, self.config.NODE_EXTRACTION_BATCH['max_tokens_per_doc'] * len(batch))
+        response = self._call_llm(prompt, temperature=0.0, response_format="json", max_tokens=max_tokens)
+        
+        parsed: Dict = {'_prompt_chars': len(prompt)}
+        # Обрезанный ответ: берём документы, успевшие прийти целиком
+        items = _parse_json_items(response)
+        
+        wanted = set(batch)
+        for item in items:
+            if not isinstance(item, dict):
+                continue
+            try:
+                doc_id = int(item.pop('doc_id'))
+            except (KeyError, TypeError, ValueError):
+                continue
+            if doc_id in wanted:
+                parsed[doc_id] = item
+        return parsed
+    
+    def _extraction_report(self) -> str:
+        """Сводка пакетного извлечения: сэкономленные вызовы и токены (оценка ~4 символа на токен)."""
+        s = self.extraction_stats
+        if not s.get('docs') and not s.get('deferred'):
+            return "LLM extraction: no documents"
+        calls_saved = s['docs'] - s['cached'] - s['llm_calls']   # включая документы, взятые у вызовов в полёте
+        tokens_saved = (s['single_prompt_chars'] - s['sent_prompt_chars']) // 4
+        return (
+            f"LLM extraction: {s['docs']} docs, {s['cached']} from cache, {s['shared']} shared in flight, "
+            f"{s['llm_calls']} calls ({s['batched_docs']} docs batched, {s['fallback_calls']} fallbacks); "
+            f"saved ~{calls_saved} calls, ~{tokens_saved} prompt tokens; "
+            f"{s['deferred']} nodes deferred, {s['enriched_later']} enriched on demand"
+        )
     
     def _get_embedding(self, text: str) -> np.ndarray:
         """Get embedding with caching"""
-        if self.cache:
-            cached = self.cache.get_embedding(text)
-            if cached is not None:
-                return cached
+        return self._get_embeddings([text])[0]
+    
+    def _get_embeddings(self, texts: List[str]) -> List[np.ndarray]:
+        """
+        Embeddings for a batch of texts: one bulk cache lookup, then a single
+        encode() over the misses. Misses are sorted by length so each
+        EMBEDDING_BATCH_SIZE chunk pads to similar lengths (length bucketing).
+        """
+        result: List[Optional[np.ndarray]] = self.cache.get_embeddings(texts) if self.cache else [None] * len(texts)
+        
+        # Уникальные промахи: один текст в батче считается один раз
+        missing: Dict[str, List[int]] = defaultdict(list)
+        for i, (text, emb) in enumerate(zip(texts, result)):
+            if emb is None:
+                missing[text].append(i)
+        if not missing:
+            return result
         
-        embedding = self.embedder.encode([text[:8000]])[0]
+        to_encode = sorted(missing, key=len)
+        with self._embed_lock:   # одна модель на все потоки источников
+            encoded = self.embedder.encode(
+                [t[:8000] for t in to_encode],
+                batch_size=self.config.EMBEDDING_BATCH_SIZE,
+                show_progress_bar=False,
+            )
+        for text, embedding in zip(to_encode, encoded):
+            for i in missing[text]:
+                result[i] = embedding
         
         if self.cache:
-            self.cache.set_embedding(text, embedding)
+            self.cache.set_embeddings(to_encode, list(encoded))
         
-        return embedding
+        return result
+    
+    def _embedding_matrix(self, nodes: List[Node]) -> np.ndarray:
+        """
+        Embeddings of `nodes` as one (n, d) matrix. Served from the mapped cache
+        matrix when every node is cached, so no per-node arrays get stacked.
+        """
+        if self.cache and nodes:
+            matrix = self.cache.get_embedding_matrix([n.full_text for n in nodes])
+            if matrix is not None:
+                return matrix
+        return np.asarray([n.embedding for n in nodes], dtype=np.float32)
+    
+    def _node_ann_index(self, embeddings: np.ndarray) -> Optional[IVFIndex]:
+        """
+        IVF index over the embeddings of self.nodes (in insertion order), or None
+        when ANN is disabled or the graph is below ANN_INDEX['min_nodes'].
+        New nodes are appended to the existing cells; the centroids are retrained
+        once the graph has doubled since the last build.
+        """
+        settings = self.config.ANN_INDEX
+        if not settings.get('enabled') or len(embeddings) < settings.get('min_nodes', 0):
+            return None
+        index = self._ann_index
+        if index is not None and len(index) < len(embeddings) <= 2 * self._ann_built_size:
+            index.add(embeddings[len(index):])
+        elif index is None or len(index) != len(embeddings):
+            t0 = time.perf_counter()
+            self._ann_index = IVFIndex(nlist=settings.get('nlist'), nprobe=settings.get('nprobe', 8),
+                                       kmeans_iter=settings.get('kmeans_iter', 10)).build(embeddings)
+            self._ann_built_size = len(embeddings)
+            logger.info(f"ANN index: {len(embeddings)} vectors, {len(self._ann_index.lists)} cells, "
+                        f"built in {time.perf_counter() - t0:.2f}s")
+        return self._ann_index
+    
+    def _target_unit_vector(self) -> np.ndarray:
+        """Unit-norm float32 embedding of target_problem, computed once per target."""
+        if self._target_unit is None or self._target_unit_for != self.target_problem:
+            target = np.asarray(self._get_embedding(self.target_problem), dtype=np.float32)
+            norm = float(np.linalg.norm(target))
+            self._target_unit = target / norm if norm > 0 else target
+            self._target_unit_for = self.target_problem
+        return self._target_unit
     
     def _update_convergence_potential(self, node: Node):
         """Estimate convergence potential"""
-        target_embedding = self._get_embedding(self.target_problem)
-        similarity = float(cosine_similarity([node.embedding], [target_embedding])[0][0])
+        self._update_convergence_potentials([node])
+    
+    def _update_convergence_potentials(self, nodes: List[Node]):
+        """
+        Convergence potential for a batch of nodes: cosine similarity to the
+        target as one matrix-vector product over row-normalized embeddings.
+        """
+        if not nodes:
+            return
         
-        potential = (
-            0.4 * similarity +
-            0.3 * min(len(node.limitations) / 5, 1.0) +
-            0.3 * min(len(node.advantages) / 5, 1.0)
-        )
+        similarities = self._target_similarities([n.embedding for n in nodes])
         
-        node.convergence_potential = potential
+        # peek: у ещё не обогащённых узлов считается только близость к цели
+        for node, similarity in zip(nodes, similarities):
+            node.convergence_potential = (
+                0.4 * float(similarity) +
+                0.3 * min(len(node.peek('limitations')) / 5, 1.0) +
+                0.3 * min(len(node.peek('advantages')) / 5, 1.0)
+            )
     
-    def _call_llm(self, prompt: str, temperature: float = 0.3, response_format: str = None, max_tokens: int = 4000) -> str:
-        """Call LLM with caching"""
+    def _target_similarities(self, embeddings: List[np.ndarray]) -> np.ndarray:
+        """Cosine similarity of each embedding to the target (one matrix-vector product)."""
+        if not len(embeddings):
+            return np.zeros(0, dtype=np.float32)
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        norms = np.linalg.norm(embeddings, axis=1)
+        return (embeddings @ self._target_unit_vector()) / np.maximum(norms, 1e-12)
+    
+    def _call_llm(self, prompt: str, temperature: float = 0.3, response_format: str = None, max_tokens: int = 4000,
+                  raise_errors: bool = False) -> str:
+        """
+        Call LLM with caching (blocking; safe from any thread, see LLMExecutor).
+        Identical prompts already in flight wait for that call instead of repeating it.
+        A failed call returns "{}", or raises with raise_errors=True so callers can
+        tell a provider failure from an empty answer.
+        """
         if self.cache:
             cached = self.cache.get_llm_response(prompt, self.config.LLM_MODEL)
             if cached:
                 return cached
         
-        self.rate_limiter.wait_if_needed()
-        
         messages = [{"role": "user", "content": prompt}]
         
         kwargs = {
@@ -2051,18 +4542,30 @@ class GraphForecasterV6:
         if response_format == "json":
             kwargs["response_format"] = {"type": "json_object"}
         
+        key = hashlib.md5((prompt + self.config.LLM_MODEL).encode()).hexdigest()
         try:
-            response = self.client.chat.completions.create(**kwargs)
-            result = response.choices[0].message.content
-            
-            if self.cache:
-                self.cache.set_llm_response(prompt, self.config.LLM_MODEL, result)
-            
-            return result
-        
+            result, _ = self._llm_flights.do(key, self._complete_llm, prompt, kwargs)
         except Exception as e:
+            if raise_errors:
+                raise
             logger.error(f"LLM call failed: {e}")
             return "{}"
+        return result
+    
+    def _complete_llm(self, prompt: str, kwargs: dict) -> str:
+        """Cache-through completion; runs once per in-flight prompt (see _call_llm)."""
+        # Предыдущий такой же вызов мог завершиться между проверкой кэша и захватом ключа
+        if self.cache:
+            cached = self.cache.get_llm_response(prompt, self.config.LLM_MODEL)
+            if cached:
+                return cached
+        
+        result = self.llm.complete(**kwargs)      # ошибку разбирает _call_llm
+        
+        if self.cache:
+            self.cache.set_llm_response(prompt, self.config.LLM_MODEL, result)
+        
+        return result
     
     # Additional methods (construct_all_edges, score_all_nodes, detect_convergence_clusters, etc.)
     # would follow the same pattern as in the previous version but using the corrected
@@ -2195,21 +4698,21 @@ class GraphForecasterV6:
 
         # Собираем эмбеддинги всех узлов
         all_ids = list(self.nodes.keys())
-        embeddings = np.array([self.nodes[nid].embedding for nid in all_ids])
-
-        for zone_id in zone_node_ids:
-            if zone_id not in self.nodes:
-                continue
-
-            zone_emb = self.nodes[zone_id].embedding.reshape(1, -1)
-            sims = cosine_similarity(zone_emb, embeddings)[0]
+        embeddings = self._embedding_matrix(list(self.nodes.values()))
+        zone_node_ids = [nid for nid in zone_node_ids if nid in self.nodes]
+        zone_embs = np.asarray([self.nodes[nid].embedding for nid in zone_node_ids], dtype=np.float32)
+
+        # Порог — выбираем узлы с sim >= 0.6, исключая сам zone-узел
+        threshold = 0.60
+        index = self._node_ann_index(embeddings)
+        if index is not None:
+            neighbours = [ids for ids, _ in index.search(zone_embs, threshold=threshold)]
+        else:
+            sims = _normalize_rows(zone_embs) @ _normalize_rows(embeddings).T
+            neighbours = [np.flatnonzero(row >= threshold) for row in sims]
 
-            # Порог — выбираем узлы с sim > 0.6, исключая сам zone-узел
-            threshold = 0.60
-            contained = [
-                all_ids[i] for i, s in enumerate(sims)
-                if s >= threshold and all_ids[i] != zone_id
-            ]
+        for zone_id, idx in zip(zone_node_ids, neighbours):
+            contained = [all_ids[i] for i in idx.tolist() if all_ids[i] != zone_id]
 
             if contained:
                 G.nodes[zone_id]["contained_nodes"] = contained
@@ -2320,42 +4823,45 @@ class GraphForecasterV6:
         """
         G = nx.DiGraph()
 
-        for node_id, node in self.nodes.items():
-            label = (node.title or node.description or node_id)[:60]
-            G.add_node(
-                node_id,
-                label=label,
-                node_type=node.node_type,
-                readiness_score=node.readiness_score,
-                convergence_potential=node.convergence_potential,
-                scientific_score=node.scientific_score,
-                investment_score=node.investment_score,
-                social_score=node.social_score,
-                maturity_score=node.maturity_score,
-                dual_use_risk=node.dual_use_risk,
-                strategic_value=node.strategic_value,
-                legal_risk_score=node.legal_risk_score,
-                export_control_risk=node.export_control_risk,
-                is_temporal_zone=node.is_temporal_zone,
-                zone_multiplier=node.zone_multiplier,
-                contained_nodes=node.contained_nodes,
-                acceleration_multiplier=node.acceleration_multiplier,
-                structural_dependency_index=node.structural_dependency_index,
-                cascade_influence=node.cascade_influence,
-                upstream_pressure=node.upstream_pressure,
-                forecast_score=node.forecast_score,
-                # Social perception
-                sentiment_review_score=node.sentiment_review_score,
-                sentiment_fiction_score=node.sentiment_fiction_score,
-                sentiment_forum_score=node.sentiment_forum_score,
-                social_perception_score=node.social_perception_score,
-                # Investment
-                investment_total_usd=node.investment_total_usd,
-                investment_rounds=node.investment_rounds,
-                investment_data_source=node.investment_data_source,
-                # Forum
-                forum_post_count=node.forum_post_count,
-            )
+        # Необогащённые (низкорелевантные) узлы попадают в граф с текущими
+        # значениями по умолчанию — LLM здесь не вызывается
+        with _enrichment_suspended():
+            for node_id, node in self.nodes.items():
+                label = (node.title or node.description or node_id)[:60]
+                G.add_node(
+                    node_id,
+                    label=label,
+                    node_type=node.node_type,
+                    readiness_score=node.readiness_score,
+                    convergence_potential=node.convergence_potential,
+                    scientific_score=node.scientific_score,
+                    investment_score=node.investment_score,
+                    social_score=node.social_score,
+                    maturity_score=node.maturity_score,
+                    dual_use_risk=node.dual_use_risk,
+                    strategic_value=node.strategic_value,
+                    legal_risk_score=node.legal_risk_score,
+                    export_control_risk=node.export_control_risk,
+                    is_temporal_zone=node.is_temporal_zone,
+                    zone_multiplier=node.zone_multiplier,
+                    contained_nodes=node.contained_nodes,
+                    acceleration_multiplier=node.acceleration_multiplier,
+                    structural_dependency_index=node.structural_dependency_index,
+                    cascade_influence=node.cascade_influence,
+                    upstream_pressure=node.upstream_pressure,
+                    forecast_score=node.forecast_score,
+                    # Social perception
+                    sentiment_review_score=node.sentiment_review_score,
+                    sentiment_fiction_score=node.sentiment_fiction_score,
+                    sentiment_forum_score=node.sentiment_forum_score,
+                    social_perception_score=node.social_perception_score,
+                    # Investment
+                    investment_total_usd=node.investment_total_usd,
+                    investment_rounds=node.investment_rounds,
+                    investment_data_source=node.investment_data_source,
+                    # Forum
+                    forum_post_count=node.forum_post_count,
+                )
 
         for edge in self.edges:
             if isinstance(edge, Edge):
@@ -2402,11 +4908,13 @@ class GraphForecasterV6:
         self.compute_structural_dependencies(G)
         self.propagate_temporal_zone_effects(G)
 
-        for node_id in G.nodes:
-            score = self.compute_forecast_score(G, node_id)
-            G.nodes[node_id]["forecast_score"] = score
-            if node_id in self.nodes:
-                self.nodes[node_id].forecast_score = score
+        # Прогноз для необогащённых узлов — по тем же значениям, что и в графе
+        with _enrichment_suspended():
+            for node_id in G.nodes:
+                score = self.compute_forecast_score(G, node_id)
+                G.nodes[node_id]["forecast_score"] = score
+                if node_id in self.nodes:
+                    self.nodes[node_id].forecast_score = score
 
         logger.info(f"Forecast computed for {G.number_of_nodes()} nodes")
         return G
@@ -2424,7 +4932,7 @@ class GraphForecasterV6:
             return {nid: (pos2d.get(nid, (0, 0))[0], pos2d.get(nid, (0, 0))[1], 0.0)
                     for nid in G.nodes}
 
-        embeddings = np.array([self.nodes[nid].embedding for nid in node_ids])
+        embeddings = self._embedding_matrix([self.nodes[nid] for nid in node_ids])
         pca = PCA(n_components=3)
         coords = pca.fit_transform(embeddings)
 
@@ -2599,6 +5107,189 @@ class GraphForecasterV6:
         else:
             fig.show()
 
+# ================================================================
+# BENCHMARKS
+# ================================================================
+
+def benchmark_cache_startup(cache_dir: str = "./cache_bench", size_gb: float = 2.0,
+                            payload_kb: int = 16, compare_pickle: bool = False) -> dict:
+    """
+    Time-to-first-query on a large cache.
+    Fills `cache_dir` with synthetic LLM responses up to `size_gb` (reused on
+    later runs), then times Cache() construction, the first LLM hit and the
+    first search miss. compare_pickle=True also times pickle.load of the same
+    data, i.e. what Cache.__init__ used to do before the first query.
+    """
+    blob = pickle.dumps("x" * (payload_kb * 1024), protocol=pickle.HIGHEST_PROTOCOL)
+    n_entries = int(size_gb * 1024**3 // len(blob))
+
+    cache = Cache(cache_dir)
+    store = cache.llm_responses
+    existing = len(store)
+    if existing < n_entries:
+        logger.info(f"Filling benchmark cache: {n_entries - existing} entries × {payload_kb} KB")
+        now = time.time()
+        for start in range(existing, n_entries, 10_000):
+            with store._conn:
+                store._conn.executemany(
+                    "INSERT OR REPLACE INTO entries (key, value, size, created, accessed) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    ((hashlib.md5(f"prompt-{i}bench".encode()).hexdigest(), blob, len(blob), now, now)
+                     for i in range(start, min(start + 10_000, n_entries)))
+                )
+    cache.close()
+
+    timings = {"entries": n_entries, "size_gb": n_entries * len(blob) / 1024**3}
+
+    t0 = time.perf_counter()
+    cache = Cache(cache_dir)
+    timings["init_s"] = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    hit = cache.get_llm_response(f"prompt-{n_entries // 2}", "bench")
+    timings["first_hit_s"] = time.perf_counter() - t0
+    assert hit is not None
+
+    t0 = time.perf_counter()
+    cache.get_search_results("benchmark query", "arxiv")
+    timings["first_miss_s"] = time.perf_counter() - t0
+    cache.close()
+
+    if compare_pickle:
+        pickle_path = os.path.join(cache_dir, "llm_responses_legacy_bench.pkl")
+        if not os.path.exists(pickle_path):
+            conn = sqlite3.connect(os.path.join(cache_dir, "llm_responses.sqlite"))
+            data = {k: pickle.loads(v) for k, v in conn.execute("SELECT key, value FROM entries")}
+            conn.close()
+            with open(pickle_path, 'wb') as f:
+                pickle.dump(data, f)
+            del data
+        t0 = time.perf_counter()
+        with open(pickle_path, 'rb') as f:
+            pickle.load(f)
+        timings["legacy_pickle_load_s"] = time.perf_counter() - t0
+
+    logger.info("Cache startup benchmark: " +
+                ", ".join(f"{k}={v:.4f}" if isinstance(v, float) else f"{k}={v}" for k, v in timings.items()))
+    return timings
+
+def benchmark_embedding_throughput(model_name: str = Config.EMBEDDING_MODEL, n_texts: int = 300,
+                                   batch_size: int = Config.EMBEDDING_BATCH_SIZE) -> dict:
+    """
+    Nodes/second of the embedding step on CPU: one encode() per text (the old
+    per-node path) vs one length-sorted batched encode() as in _get_embeddings.
+    Texts are synthetic abstracts of mixed length; the cache is not involved.
+    """
+    vocab = ("laser femtosecond voxel silica storage optical density retrieval polarization "
+             "birefringence nanograting writing speed throughput archival medium encoding "
+             "photonics semiconductor lithography beam steering parallel imaging").split()
+    rng = random.Random(0)
+    texts = [" ".join(rng.choice(vocab) for _ in range(rng.randint(30, 400))) for _ in range(n_texts)]
+
+    embedder = SentenceTransformer(model_name, device="cpu")
+    embedder.encode(texts[:8], show_progress_bar=False)   # прогрев
+
+    t0 = time.perf_counter()
+    for text in texts:
+        embedder.encode([text[:8000]], show_progress_bar=False)
+    sequential_s = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    embedder.encode([t[:8000] for t in sorted(texts, key=len)], batch_size=batch_size,
+                    show_progress_bar=False)
+    batched_s = time.perf_counter() - t0
+
+    result = {
+        "texts": n_texts,
+        "sequential_nodes_per_s": n_texts / sequential_s,
+        "batched_nodes_per_s": n_texts / batched_s,
+        "speedup": sequential_s / batched_s,
+    }
+    logger.info("Embedding throughput benchmark: " + ", ".join(
+        f"{k}={v:.1f}" if isinstance(v, float) else f"{k}={v}" for k, v in result.items()))
+    return result
+
+def benchmark_ann_recall(n: int = 20_000, dim: int = 384, threshold: float = 0.48,
+                         nprobes: Tuple[int, ...] = (1, 2, 4, 8, 16, 32),
+                         nlist: Optional[int] = None) -> List[dict]:
+    """
+    Recall vs speed of IVFIndex.pairs_above against the exact blocked result
+    on clustered synthetic embeddings.
+    """
+    rng = np.random.default_rng(0)
+    centers = rng.standard_normal((max(n // 50, 1), dim)).astype(np.float32)
+    embeddings = centers[rng.integers(0, len(centers), n)] + \
+        0.9 * rng.standard_normal((n, dim)).astype(np.float32)
+
+    t0 = time.perf_counter()
+    ei, ej, _ = _similar_pairs_blocked(embeddings, threshold)
+    exact_s = time.perf_counter() - t0
+    exact = set(zip(ei.tolist(), ej.tolist()))
+
+    t0 = time.perf_counter()
+    index = IVFIndex(nlist=nlist).build(embeddings)
+    build_s = time.perf_counter() - t0
+    logger.info(f"ANN benchmark: n={n}, exact pairs={len(exact)} in {exact_s:.2f}s, "
+                f"index build {build_s:.2f}s ({len(index.lists)} cells)")
+
+    results = []
+    for nprobe in nprobes:
+        index.nprobe = nprobe
+        t0 = time.perf_counter()
+        ai, aj, _ = index.pairs_above(threshold)
+        elapsed = time.perf_counter() - t0
+        found = len(exact & set(zip(ai.tolist(), aj.tolist())))
+        row = {"nprobe": nprobe, "recall": found / max(len(exact), 1),
+               "search_s": elapsed, "speedup": exact_s / max(elapsed, 1e-9)}
+        logger.info(f"  nprobe={nprobe:<3} recall={row['recall']:.3f} "
+                    f"search={elapsed:.2f}s speedup={row['speedup']:.1f}x")
+        results.append(row)
+    return results
+
+def benchmark_auto_connect(sizes: Tuple[int, ...] = (1_000, 10_000, 50_000), dim: int = 384,
+                           threshold: float = 0.48, tile_size: int = Config.EDGE_TILE_SIZE,
+                           dense_max: int = 10_000) -> List[dict]:
+    """
+    Time and peak memory of semantic edge extraction on clustered synthetic
+    embeddings. The blocked path (_similar_pairs_blocked) runs at every size;
+    the old dense path (full cosine_similarity + Python double loop) only up
+    to dense_max nodes.
+    """
+    import tracemalloc
+
+    rng = np.random.default_rng(0)
+    results = []
+    for n in sizes:
+        centers = rng.standard_normal((max(n // 50, 1), dim)).astype(np.float32)
+        embeddings = centers[rng.integers(0, len(centers), n)] + \
+            0.9 * rng.standard_normal((n, dim)).astype(np.float32)
+
+        tracemalloc.start()
+        t0 = time.perf_counter()
+        rows, _, _ = _similar_pairs_blocked(embeddings, threshold, tile_size)
+        row = {"nodes": n, "pairs": int(rows.size), "blocked_s": time.perf_counter() - t0,
+               "blocked_peak_mb": tracemalloc.get_traced_memory()[1] / 1e6}
+        tracemalloc.stop()
+
+        if n <= dense_max:
+            tracemalloc.start()
+            t0 = time.perf_counter()
+            sim_matrix = cosine_similarity(embeddings)
+            dense_pairs = 0
+            for i in range(n):
+                for j in range(i + 1, n):
+                    if sim_matrix[i, j] > threshold:
+                        dense_pairs += 1
+            row["dense_s"] = time.perf_counter() - t0
+            row["dense_peak_mb"] = tracemalloc.get_traced_memory()[1] / 1e6
+            tracemalloc.stop()
+            del sim_matrix
+
+        logger.info("Auto-connect benchmark: " + ", ".join(
+            f"{k}={v:.3f}" if isinstance(v, float) else f"{k}={v}" for k, v in row.items()))
+        results.append(row)
+    return results
+
 # ================================================================
 # MAIN
 # ================================================================
@@ -2606,6 +5297,34 @@ class GraphForecasterV6:
 if __name__ == "__main__":
     
     config = Config()
+
+    if sys.argv[1:2] == ["compact-cache"]:
+        cache = Cache(config.CACHE_DIR, config.EMBEDDING_CACHE_DTYPE, config.CACHE_BUDGETS)
+        cache.compact()
+        cache.close()
+        sys.exit(0)
+
+    if sys.argv[1:2] == ["bench-cache-startup"]:
+        # python GF.py bench-cache-startup [cache_dir] [size_gb]
+        benchmark_cache_startup(
+            cache_dir=sys.argv[2] if len(sys.argv) > 2 else "./cache_bench",
+            size_gb=float(sys.argv[3]) if len(sys.argv) > 3 else 2.0,
+            compare_pickle=True,
+        )
+        sys.exit(0)
+
+    if sys.argv[1:2] == ["bench-auto-connect"]:
+        benchmark_auto_connect()
+        sys.exit(0)
+
+    if sys.argv[1:2] == ["bench-ann"]:
+        benchmark_ann_recall(n=int(sys.argv[2]) if len(sys.argv) > 2 else 20_000)
+        sys.exit(0)
+
+    if sys.argv[1:2] == ["bench-embeddings"]:
+        benchmark_embedding_throughput(n_texts=int(sys.argv[2]) if len(sys.argv) > 2 else 300)
+        sys.exit(0)
+
     config.MAX_RECURSIVE_DEPTH = 3
     config.MAX_NODES_PER_LEVEL = 30
     
@@ -2651,4 +5370,7 @@ if __name__ == "__main__":
         )
 
     gf.visualize("graph_output.html", mode="2d")
-    gf.visualize("graph_output.html", mode="3d")  # сохранит graph_output_3d.html
\ No newline at end of file
+    gf.visualize("graph_output.html", mode="3d")  # сохранит graph_output_3d.html
+
+    if gf.cache:
+        logger.info("\n" + gf.cache.stats.report())
\ No newline at end of file